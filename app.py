@@ -6,14 +6,27 @@ import logging
 from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix
 from extensions import db, login_manager
+from utils import metrics, sessions, events, warmup, ratelimit
+from utils.log import configure_logging
+from utils.profiler import request_profiler
+from utils.db import engine_options_from_env, create_missing_indexes, remember_writes
+from utils.request_cache import request_cached
+from utils.compression import CompressionMiddleware
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+configure_logging()
 
 # create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Compiled templates are shared on disk by all workers (see utils.warmup)
+warmup.init_app(app)
+# Set HTTP_COMPRESSION=0 when a front proxy already compresses responses
+if os.environ.get("HTTP_COMPRESSION", "1") != "0":
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+# Proxies in front of the app that append to X-Forwarded-For. Rate limits key on the
+# client address, so set PROXY_FOR_HOPS=0 when clients connect directly (or it can be spoofed)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ.get("PROXY_FOR_HOPS", 1)), x_proto=1, x_host=1)
 
 # configure the database
 database_url = os.environ.get("DATABASE_URL")
@@ -21,39 +34,78 @@ logging.debug(f"Database URL: {database_url}")
 if not database_url:
     raise RuntimeError("DATABASE_URL environment variable is not set")
 app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env()
+# Optional read replica for catalog and report views (see utils.db.read_replica)
+replica_url = os.environ.get("DATABASE_REPLICA_URL")
+if replica_url:
+    app.config["SQLALCHEMY_BINDS"] = {"replica": replica_url}
+    remember_writes(app)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["METRICS_DIR"] = os.environ.get("METRICS_DIR")
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR")
+app.config["PROFILE_SAMPLE_RATE"] = os.environ.get("PROFILE_SAMPLE_RATE", 0)
+app.config["PROFILER_MODE"] = os.environ.get("PROFILER_MODE", "sample")
 
 # initialize extensions
 db.init_app(app)
 login_manager.init_app(app)
+metrics.init_app(app)
+# After metrics, so refused requests are still counted and timed
+ratelimit.init_app(app)
+sessions.init_app(app, os.environ.get("SESSION_BACKEND", "db"))
+request_profiler.init_app(app)
+events.init_app(app)
 
 @login_manager.user_loader
+@request_cached('user')
 def load_user(user_id):
     from models import User
     return User.query.get(int(user_id))
 
+@app.context_processor
+def inject_request_data():
+    # Callables, so pages that don't show the cart or category nav never query them
+    from utils.helpers import get_cart_summary, get_categories
+    return {'cart_summary': get_cart_summary, 'nav_categories': get_categories}
+
 # Register blueprints
 from routes.auth import auth_bp
 from routes.main import main_bp
 from routes.products import products_bp
 from routes.admin import admin_bp
+from routes.api import api_bp
 
 app.register_blueprint(main_bp)
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(products_bp, url_prefix='/products')
 app.register_blueprint(admin_bp, url_prefix='/admin')
+app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+# CLI commands
+from utils.jobs import worker_command
+from utils.inventory import compact_command
+from utils.customers import rebuild_stats_command, backfill_stats_if_empty
+from utils.archive import archive_command
+from utils.product_pages import backfill_command, backfill_if_empty
+app.cli.add_command(worker_command)
+app.cli.add_command(compact_command)
+app.cli.add_command(sessions.cleanup_command)
+app.cli.add_command(rebuild_stats_command)
+app.cli.add_command(archive_command)
+app.cli.add_command(backfill_command)
+app.cli.add_command(warmup.precompile_command)
 
 with app.app_context():
     # Import models here
     import models
-    db.create_all()
+    # Only the primary; the replica receives schema changes through replication
+    db.create_all(bind_key=None)
+    create_missing_indexes()
     
     # Create sample data
     models.create_sample_data()
+    backfill_if_empty()
+    backfill_stats_if_empty()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
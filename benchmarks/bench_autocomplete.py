@@ -0,0 +1,84 @@
+"""Build time, memory and lookup latency of the autocomplete prefix index.
+
+    python benchmarks/bench_autocomplete.py --products 1000000
+
+Products are synthesized in memory, so no database is needed; the numbers
+cover only the index itself (utils.autocomplete.PrefixIndex).
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from utils.autocomplete import PrefixIndex  # noqa: E402
+
+ADJECTIVES = ['fresh', 'organic', 'smoked', 'roasted', 'ground', 'whole', 'premium', 'wild', 'sun dried', 'cold pressed']
+SPICES = ['cardamom', 'turmeric', 'cumin', 'coriander', 'fennel', 'clove', 'cinnamon', 'nutmeg', 'saffron',
+          'paprika', 'pepper', 'chilli', 'ginger', 'garlic', 'mustard', 'fenugreek', 'ajwain', 'mace', 'anise']
+FORMS = ['powder', 'seeds', 'pods', 'sticks', 'flakes', 'paste', 'blend', 'masala', 'oil', 'extract']
+CATEGORIES = [(i, name) for i, name in enumerate(['Whole Spices', 'Ground Spices', 'Blends', 'Herbs', 'Oils', 'Gift Packs'], 1)]
+QUERIES = ['c', 'ca', 'car', 'cardamom', 'smoked pa', 'org cum se', 'sku00123', 'zzz']
+
+
+def rows(count, seed=7):
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(SPICES)} {rng.choice(FORMS)} {rng.randint(50, 1000)}g'.title()
+        yield product_id, name, f'SKU{product_id:07d}', rng.randint(1, len(CATEGORIES)), rng.randint(0, 5000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1_000_000)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    # Measure memory on a separate build: tracemalloc slows allocation too much to time it,
+    # and tearing its traces down would be charged to the first lookup
+    tracemalloc.start()
+    index = PrefixIndex.build(rows(args.products), CATEGORIES)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    del index
+    tracemalloc.stop()
+    gc.collect()
+
+    started = time.perf_counter()
+    index = PrefixIndex.build(rows(args.products), CATEGORIES)
+    build_seconds = time.perf_counter() - started
+    gc.collect()
+
+    print(f'products        {args.products:>12,}')
+    print(f'tokens          {len(index.tokens):>12,}')
+    print(f'build           {build_seconds:>11.2f}s')
+    print(f'resident        {current / 2**20:>10.1f}MB')
+    print(f'peak during     {peak / 2**20:>10.1f}MB')
+    print()
+    print(f'{"query":<14}{"first ms":>10}{"warm us":>10}{"hits":>6}')
+    for query in QUERIES:
+        started = time.perf_counter()
+        results = index.search(query, 8)
+        first = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            index.search(query, 8)
+        warm = (time.perf_counter() - started) / args.iterations * 1e6
+        print(f'{query:<14}{first:>10.2f}{warm:>10.1f}{len(results):>6}')
+
+    started = time.perf_counter()
+    for product_id in range(args.products + 1, args.products + 1001):
+        index.upsert(product_id, f'Test Cardamom Blend {product_id}', f'NEW{product_id}', 1)
+    for product_id in range(1, 1001):
+        index.remove(product_id)
+    print()
+    print(f'incremental     {(time.perf_counter() - started) / 2000 * 1000:>10.2f}ms per upsert/remove')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Compare the JSON catalog API with the HTML product listing.
+
+    DATABASE_URL=sqlite:///bench.db python benchmarks/bench_catalog_api.py --iterations 500
+
+Runs in-process through Flask's test client, so the numbers measure
+query, serialization/rendering and compression cost without network noise.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from app import app  # noqa: E402
+
+CASES = [
+    ('html listing', '/products/', {}),
+    ('api listing (12)', '/api/v1/products?limit=12', {}),
+    ('api listing (12, gzip)', '/api/v1/products?limit=12', {'Accept-Encoding': 'gzip'}),
+    ('api listing (12, 2 fields)', '/api/v1/products?limit=12&fields=name,price', {}),
+    ('api listing (304)', '/api/v1/products?limit=12', None),
+    ('html detail', '/products/1', {}),
+    ('api detail', '/api/v1/products/1', {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=300)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    print(f'{"case":<30}{"ms/req":>10}{"bytes":>10}{"status":>8}')
+    for name, url, headers in CASES:
+        if headers is None:
+            etag = client.get(url).headers['ETag']
+            headers = {'If-None-Match': etag}
+        client.get(url, headers=headers)  # warm-up
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            response = client.get(url, headers=headers)
+        elapsed = (time.perf_counter() - start) / args.iterations * 1000
+        print(f'{name:<30}{elapsed:>10.2f}{len(response.data):>10}{response.status_code:>8}')
+
+
+if __name__ == '__main__':
+    main()
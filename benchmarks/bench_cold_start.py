@@ -0,0 +1,76 @@
+"""First-request latency of a fresh worker, with and without template caching and warm-up.
+
+    DATABASE_URL=sqlite:///bench.db python benchmarks/bench_cold_start.py --runs 5
+
+Every run starts a new Python process, imports the app the way a gunicorn
+worker does and times the first request to each page, so template
+compilation and lazy initialisation land on that request. Modes:
+
+  cold       no bytecode cache (TEMPLATE_CACHE_DIR=off)
+  bytecode   templates loaded from the on-disk bytecode cache
+  warmed     bytecode cache plus utils.warmup.warm_worker before serving
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/', '/products/', '/products/1', '/auth/login', '/products/cart', '/contact']
+MODES = ('cold', 'bytecode', 'warmed')
+
+
+def child(mode):
+    sys.path.insert(0, ROOT)
+    from app import app
+    from utils import warmup
+
+    warm_ms = 0.0
+    if mode == 'warmed':
+        started = time.perf_counter()
+        warmup.warm_worker(app)
+        warm_ms = (time.perf_counter() - started) * 1000
+
+    client = app.test_client()
+    timings = {}
+    for path in PATHS:
+        started = time.perf_counter()
+        client.get(path)
+        timings[path] = (time.perf_counter() - started) * 1000
+    print(json.dumps({'warm_ms': warm_ms, 'first_request_ms': timings}))
+
+
+def run(mode, cache_dir):
+    env = dict(os.environ, LOG_LEVEL='WARNING', TEMPLATE_CACHE_DIR='off' if mode == 'cold' else cache_dir)
+    out = subprocess.run([sys.executable, __file__, '--child', mode], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Fill the bytecode cache once, as the precompile command would during a deploy
+        run('bytecode', cache_dir)
+        print(f"{'mode':<10} {'warm-up ms':>11} {'sum of first requests ms':>26} {'slowest page ms':>16}")
+        for mode in MODES:
+            results = [run(mode, cache_dir) for _ in range(args.runs)]
+            warm = statistics.median(r['warm_ms'] for r in results)
+            total = statistics.median(sum(r['first_request_ms'].values()) for r in results)
+            slowest = statistics.median(max(r['first_request_ms'].values()) for r in results)
+            print(f'{mode:<10} {warm:11.1f} {total:26.1f} {slowest:16.1f}')
+
+
+if __name__ == '__main__':
+    main()
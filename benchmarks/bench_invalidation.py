@@ -0,0 +1,94 @@
+"""Propagation latency of cache invalidation events between worker processes.
+
+    DATABASE_URL=sqlite:///bench.db python benchmarks/bench_invalidation.py --workers 4 --events 200
+
+Starts --workers processes that each run the invalidation listener (the
+same one gunicorn workers run), publishes --events events from this
+process and reports how long each took to reach every worker. With a
+PostgreSQL DATABASE_URL this measures LISTEN/NOTIFY; otherwise the Unix
+socket fallback.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+ENTITY = 'bench'
+
+
+def worker(ready, received):
+    from app import app
+    from utils import events
+
+    @events.on(ENTITY)
+    def record(ids, version):
+        received.put((os.getpid(), ids[0], time.time()))
+
+    events.start_listener(app)
+    ready.put(os.getpid())
+    while True:
+        time.sleep(60)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.01, help='Seconds between published events.')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    ready, received = ctx.Queue(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(ready, received), daemon=True) for _ in range(args.workers)]
+    for proc in procs:
+        proc.start()
+    for _ in procs:
+        ready.get(timeout=60)
+    time.sleep(1.0)  # let every listener bind/LISTEN
+
+    from app import app
+    from utils import events
+
+    sent = {}
+    with app.app_context():
+        for seq in range(1, args.events + 1):
+            sent[seq] = time.time()
+            events.publish(ENTITY, [seq])
+            time.sleep(args.interval)
+
+    expected = args.events * args.workers
+    latencies = []
+    deadline = time.time() + 10
+    while len(latencies) < expected and time.time() < deadline:
+        try:
+            _, seq, at = received.get(timeout=max(deadline - time.time(), 0.01))
+        except Exception:
+            break
+        latencies.append((at - sent[seq]) * 1000)
+
+    for proc in procs:
+        proc.terminate()
+
+    with app.app_context():
+        transport = type(events.get_transport()).__name__
+    print(f'transport   {transport}')
+    print(f'delivered   {len(latencies)}/{expected}')
+    if latencies:
+        print(f'p50         {statistics.median(latencies):8.2f} ms')
+        print(f'p95         {percentile(latencies, 95):8.2f} ms')
+        print(f'p99         {percentile(latencies, 99):8.2f} ms')
+        print(f'max         {max(latencies):8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Compare gunicorn sync and gevent workers under the same concurrent load.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_workers.py --concurrency 100
+
+Starts gunicorn once per worker class against the configured database,
+replays the same request mix from a thread pool and prints throughput
+and latency percentiles.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/', '/products/', '/products/1', '/products/cart-count']
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/products/cart-count', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def hit(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+        ok = True
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_load(base_url, concurrency, total):
+    urls = [base_url + PATHS[i % len(PATHS)] for i in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, urls))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if not r[1])
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': pct(0.95),
+        'p99': pct(0.99),
+        'errors': errors,
+    }
+
+
+def bench(worker_class, args):
+    port = args.port
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, LOG_LEVEL='WARNING')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers), 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        wait_until_up(base_url)
+        run_load(base_url, args.concurrency, min(args.requests, 100))  # warm-up
+        return run_load(base_url, args.concurrency, args.requests)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--worker-class', action='append', dest='classes')
+    args = parser.parse_args()
+
+    print(f'{"workers":<10}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+    for worker_class in args.classes or ['sync', 'gevent']:
+        r = bench(worker_class, args)
+        print(f'{worker_class:<10}{r["rps"]:>10.1f}{r["p50"]:>10.1f}{r["p95"]:>10.1f}{r["p99"]:>10.1f}{r["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""Microbenchmarks for model and helper hot paths, with a regression gate.
+
+    python benchmarks/microbench.py                     # run and compare with the baselines
+    python benchmarks/microbench.py --save              # record new baselines
+    python benchmarks/microbench.py --sizes 100 --only cart --threshold 0.5
+
+Each catalog size runs in its own process against a freshly seeded SQLite
+database. Every benchmark reports the best time per call over several
+rounds (the least noisy estimate), the bytes allocated during one call
+(tracemalloc peak) and the SQL statements one call executes.
+
+The run fails (exit 1) when time or allocations exceed the baseline by
+more than --threshold, or a call issues more queries than before, and the
+regression repeats on a re-run. Times are scaled by a calibration
+workload measured alongside them. Baselines live in
+benchmarks/baselines/microbench.json; record them with --save on the
+machine that runs the gate.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'microbench.json')
+DEFAULT_SIZES = (100, 5000)
+# Benchmarks are repeated until a round takes at least this long
+MIN_ROUND_SECONDS = 0.05
+MAX_ITERATIONS = 1000
+ROUNDS = 7
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register setup(ctx) -> callable; only the returned callable is measured"""
+    def decorator(f):
+        BENCHMARKS[name] = f
+        return f
+    return decorator
+
+
+# --- benchmarks (imported lazily: the app reads DATABASE_URL at import) ----------------
+
+@benchmark('listing.default')
+def listing_default(ctx):
+    from models import ProductPage
+    return lambda: ProductPage.get_all(limit=12)
+
+
+@benchmark('listing.filtered')
+def listing_filtered(ctx):
+    from models import ProductPage
+    return lambda: ProductPage.get_all(category=ctx['category_id'], search='spice', price_range=(5, 50),
+                                       in_stock=True, sort='price_desc', limit=12)
+
+
+@benchmark('listing.popular')
+def listing_popular(ctx):
+    from models import ProductPage
+    return lambda: ProductPage.get_all(sort='popular', limit=12)
+
+
+@benchmark('cart.get_items')
+def cart_get_items(ctx):
+    from utils.helpers import get_cart_items
+
+    def run():
+        with ctx['user_request']():
+            return get_cart_items()
+    return run
+
+
+@benchmark('cart.add')
+def cart_add(ctx):
+    from utils.helpers import add_to_cart
+    product_ids = ctx['product_ids']
+    calls = iter(range(10 ** 9))
+
+    def run():
+        with ctx['user_request']():
+            add_to_cart(product_ids[next(calls) % len(product_ids)], 1)
+    return run
+
+
+@benchmark('order.create')
+def order_create(ctx):
+    from models import Order, ProductPage
+    pages = [ProductPage.get_by_id(i) for i in ctx['product_ids'][:3]]
+    items = [{'product_id': p.product_id, 'quantity': 1, 'price': p.price} for p in pages]
+    total = sum(p.price for p in pages)
+    address_id = ctx['address_id']
+    return lambda: Order.create_order(ctx['user_id'], items, address_id, address_id, total,
+                                      'card', 'paid', 'processing')
+
+
+@benchmark('render.products')
+def render_products(ctx):
+    from flask import render_template
+    from models import ProductPage
+    from utils.facets import compute_facets, PRICE_BUCKETS, SORTS
+
+    def run():
+        with ctx['app'].app_context(), ctx['app'].test_request_context('/products/'):
+            return render_template('products.html', products=ProductPage.get_all(limit=12), categories=[],
+                                   wishlist_ids=set(), selected_category=None, search_query=None,
+                                   facets=compute_facets(), filters={}, price_buckets=PRICE_BUCKETS,
+                                   sorts=SORTS, page=1)
+    return run
+
+
+@benchmark('render.product_detail')
+def render_product_detail(ctx):
+    from flask import render_template
+    from models import ProductPage
+    product_id = ctx['product_ids'][0]
+
+    def run():
+        with ctx['app'].app_context(), ctx['app'].test_request_context(f'/products/{product_id}'):
+            product = ProductPage.get_by_id(product_id)
+            return render_template('product_detail.html', product=product, related_products=product.get_related(),
+                                   stock_level=product.stock_quantity, in_wishlist=False)
+    return run
+
+
+# --- child process: seed and measure ------------------------------------------------
+
+def seed(size):
+    from contextlib import contextmanager
+    from flask_login import login_user
+    from app import app
+    from extensions import db
+    from models import Address, Category, Product, User
+    from utils import product_pages
+
+    with app.app_context():
+        categories = [c.id for c in Category.query.order_by(Category.id)]
+        existing = Product.query.count()
+        rows = [{
+            'name': f'Bench Spice {i}', 'description': f'Benchmark spice blend number {i}',
+            'price': 5 + (i % 90) * 0.5, 'original_price': 60 if i % 4 == 0 else None,
+            'category_id': categories[i % len(categories)], 'stock_quantity': 10000,
+            'sku': f'BENCH{i:07d}', 'image': '', 'status': 'active',
+        } for i in range(max(size - existing, 0))]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(db.insert(Product), rows[start:start + 5000])
+        db.session.commit()
+        product_pages.backfill(batch_size=5000)
+
+        user = User.query.filter_by(email='john@example.com').first()
+        address = Address.query.filter_by(user_id=user.id).first() or Address.create_address(
+            user.id, 'John', 'Doe', '1 Bench Street', '', 'Kochi', 'Kerala', '682001', 'India', is_default=True)
+        product_ids = [pid for pid, in db.session.query(Product.id).order_by(Product.id).limit(20)]
+        user_id, address_id, category_id = user.id, address.id, categories[0]
+
+    @contextmanager
+    def user_request():
+        # A fresh app context, as in a real request: its own g (request memo) and session
+        with app.app_context(), app.test_request_context():
+            login_user(db.session.get(User, user_id))
+            yield
+        db.session.remove()
+
+    return {'app': app, 'user_id': user_id, 'address_id': address_id, 'category_id': category_id,
+            'product_ids': product_ids, 'user_request': user_request}
+
+
+def measure(f):
+    from sqlalchemy import event
+    from extensions import db
+
+    f()  # warm caches, compile templates, prepare statements
+    iterations = 1
+    while iterations < MAX_ITERATIONS:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            f()
+        if time.perf_counter() - started >= MIN_ROUND_SECONDS:
+            break
+        iterations *= 2
+    rounds = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            f()
+        rounds.append((time.perf_counter() - started) / iterations)
+
+    queries = []
+    listener = lambda *args: queries.append(1)  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    tracemalloc.start()
+    try:
+        f()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    return {'time_us': round(min(rounds) * 1e6, 1), 'alloc_kb': round(peak / 1024, 1),
+            'queries': len(queries)}
+
+
+def calibrate():
+    """Best time of a fixed pure-Python workload, in µs; used to cancel out machine speed"""
+    def workload():
+        data = {}
+        for i in range(20000):
+            data[str(i)] = [i] * 3
+        return sorted(data, key=len)
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        workload()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1e6, 1)
+
+
+def child(size, only):
+    ctx = seed(size)
+    results = {'_calibration_us': calibrate()}
+    for name, setup in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+        with ctx['app'].app_context():
+            results[name] = measure(setup(ctx))
+    # Again at the end, so a machine that got busier mid-run is still compared fairly
+    results['_calibration_us'] = min(results['_calibration_us'], calibrate())
+    print(json.dumps(results))
+
+
+# --- parent process: run sizes, compare, save -------------------------------------------
+
+def run_size(size, only):
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, LOG_LEVEL='WARNING', RATE_LIMITING='0',
+                   DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+                   METRICS_DIR=directory, TEMPLATE_CACHE_DIR='off')
+        env.pop('DATABASE_REPLICA_URL', None)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(size)]
+                             + (['--only', only] if only else []),
+                             env=env, cwd=ROOT, capture_output=True, text=True)
+        if out.returncode != 0:
+            sys.stderr.write(out.stderr)
+            raise SystemExit(f'benchmarks failed at size {size}')
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(current, baseline, threshold):
+    """{(size, name, metric): message} for every metric worse than the baseline allows"""
+    failures = {}
+    for size, results in current.items():
+        base_results = baseline.get(size, {})
+        # Times are compared in units of the calibration workload, so a slower or busier
+        # machine than the one that recorded the baseline does not fail the gate by itself
+        scale = base_results.get('_calibration_us', 1) / results.get('_calibration_us', 1)
+        for name, result in results.items():
+            base = base_results.get(name)
+            if name.startswith('_') or not base:
+                continue
+            if result['queries'] > base['queries']:
+                failures[size, name, 'queries'] = f"{name} @ {size}: queries {base['queries']} -> {result['queries']}"
+            for metric, value in (('time_us', result['time_us'] * scale), ('alloc_kb', result['alloc_kb'])):
+                if base[metric] and value > base[metric] * (1 + threshold):
+                    failures[size, name, metric] = (f'{name} @ {size}: {metric} {base[metric]} -> {round(value, 1)} '
+                                                    f'(+{(value / base[metric] - 1) * 100:.0f}%)')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='Catalog sizes (products).')
+    parser.add_argument('--only', help='Run benchmarks whose name contains this.')
+    parser.add_argument('--threshold', type=float, default=float(os.environ.get('MICROBENCH_THRESHOLD', 0.25)),
+                        help='Allowed relative slowdown or allocation growth before failing.')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='Re-run sizes with regressions this many times; only repeat offenders fail.')
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baselines.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        sys.path.insert(0, ROOT)
+        child(args.child, args.only)
+        return
+
+    current = {}
+    for size in (int(s) for s in args.sizes.split(',')):
+        current[str(size)] = run_size(size, args.only)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+
+    print(f"{'benchmark':<24} {'size':>6} {'time µs':>10} {'base':>10} {'alloc KB':>9} {'queries':>8}")
+    for size, results in current.items():
+        for name, result in results.items():
+            if name.startswith('_'):
+                continue
+            base = baseline.get(size, {}).get(name, {})
+            print(f"{name:<24} {size:>6} {result['time_us']:>10} {base.get('time_us', '-'):>10} "
+                  f"{result['alloc_kb']:>9} {result['queries']:>8}")
+
+    if args.save:
+        merged = {size: dict(baseline.get(size, {}), **results) for size, results in current.items()}
+        merged.update({size: results for size, results in baseline.items() if size not in merged})
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'results': merged}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baselines written to {os.path.relpath(args.baseline, ROOT)}')
+        return
+
+    failures = compare(current, baseline, args.threshold)
+    for _ in range(args.retries):
+        if not failures:
+            break
+        # Only what regresses again on a fresh run counts; one noisy round is not a regression
+        sizes = sorted({size for size, _, _ in failures}, key=int)
+        print(f"\nRe-running size(s) {', '.join(sizes)} to confirm {len(failures)} regression(s)")
+        rerun = compare({size: run_size(int(size), args.only) for size in sizes}, baseline, args.threshold)
+        failures = {key: rerun[key] for key in failures if key in rerun}
+    if failures:
+        print(f'\n{len(failures)} regression(s) beyond {args.threshold:.0%}:')
+        for failure in failures.values():
+            print('  ' + failure)
+        sys.exit(1)
+    if baseline:
+        print(f'\nNo regressions beyond {args.threshold:.0%}')
+    else:
+        print('\nNo baselines yet; run with --save to record them')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,45 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import LoginManager
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql import Select
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+class RoutingSession(Session):
+    """Sends SELECTs to the 'replica' bind when the request opted in and nothing was written.
+
+    Views opt in with utils.db.read_replica. Once this session flushes, every
+    later statement in the request goes to the primary so callers read their
+    own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and has_app_context() and g.get('db_route') == 'replica'
+                and 'replica' in self._db.engines):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _pin_to_primary():
+    if has_app_context():
+        g.db_route = 'primary'
+        # Turned into a short-lived cookie by utils.db.remember_writes; no session write per flush
+        g.db_wrote = True
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    _pin_to_primary()
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _after_bulk_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        _pin_to_primary()
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
-login_manager.login_message = 'Please log in to access this page.' 
\ No newline at end of file
+login_manager.login_message = 'Please log in to access this page.' 
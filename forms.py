@@ -1,3 +1,4 @@
+import secrets
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, TextAreaField, FloatField, IntegerField, SelectField, HiddenField, BooleanField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, EqualTo
@@ -36,6 +37,7 @@ class ProductForm(FlaskForm):
     price = FloatField('Price', validators=[DataRequired(), NumberRange(min=0.01)])
     category = SelectField('Category', validators=[DataRequired()])
     stock_quantity = IntegerField('Stock Quantity', validators=[DataRequired(), NumberRange(min=0)])
+    stock_baseline = HiddenField()
     sku = StringField('SKU', validators=[DataRequired(), Length(min=2, max=50)])
     image = StringField('Image URL')
 
@@ -62,6 +64,8 @@ class ContactForm(FlaskForm):
     message = TextAreaField('Message', validators=[DataRequired(), Length(min=10)])
 
 class CheckoutForm(FlaskForm):
+    # Issued with the form and echoed back so retries of the same submission are recognised
+    idempotency_key = HiddenField(default=lambda: secrets.token_urlsafe(32), validators=[DataRequired(), Length(max=64)])
     shipping_address = SelectField('Shipping Address', validators=[DataRequired()])
     billing_address = SelectField('Billing Address', validators=[DataRequired()])
     payment_method = SelectField('Payment Method', choices=[
@@ -0,0 +1,61 @@
+# Gunicorn settings; loaded automatically from the working directory.
+# GUNICORN_WORKER_CLASS=gevent enables the cooperative serving mode.
+import os
+import shutil
+import tempfile
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    # Each worker multiplexes many greenlets over one pool, so it needs more connections than a sync worker
+    os.environ.setdefault('DB_POOL_SIZE', '20')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '30')
+    os.environ.setdefault('DB_POOL_TIMEOUT', '10')
+    # Load shedding measures occupancy against what the pool can actually serve at once
+    os.environ.setdefault('SHED_WORKER_CAPACITY', '50')
+
+
+def on_starting(server):
+    # Workers merge every snapshot in METRICS_DIR, so start from an empty one. Without
+    # an explicit METRICS_DIR the master takes a private directory, so snapshots from
+    # earlier runs, CLI commands or benchmarks never show up in this server's metrics
+    from utils import metrics
+    if not os.environ.get('METRICS_DIR'):
+        os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='spice-metrics-')
+        server.private_metrics_dir = os.environ['METRICS_DIR']
+    metrics.reset_directory(os.environ['METRICS_DIR'])
+
+
+def child_exit(server, worker):
+    from utils import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    private = getattr(server, 'private_metrics_dir', None)
+    if private:
+        shutil.rmtree(private, ignore_errors=True)
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # Before the app is imported, so every connection it opens is cooperative
+        from utils.cooperative import patch_psycopg
+        patch_psycopg()
+
+
+def post_worker_init(worker):
+    if worker_class == 'gevent':
+        from utils.cooperative import configure_threadpool
+        configure_threadpool()
+    # Warm caches before the first request rather than during it; the autocomplete index
+    # builds in the background so a large catalog cannot hold the worker past its timeout.
+    # This is the earliest hook with the app loaded: post_fork runs before the worker imports it.
+    from app import app
+    from utils import autocomplete, events, ratelimit, warmup
+    ratelimit.register_worker()
+    if os.environ.get('WORKER_WARMUP', '1') != '0':
+        warmup.warm_worker(app)
+    autocomplete.warm(app)
+    events.start_listener(app)
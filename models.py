@@ -7,18 +7,26 @@ def set_all_product_stock_to_10kg():
     from app import app
     with app.app_context():
         from models import Product
-        products = Product.query.all()
-        for product in products:
-            product.stock_quantity = 10000
+        from utils.inventory import get_stock_levels, record_movement
+        product_ids = [product_id for (product_id,) in db.session.query(Product.id)]
+        # Record adjustments in the ledger so concurrent sales are not overwritten
+        for product_id, level in get_stock_levels(product_ids).items():
+            if level != 10000:
+                record_movement(product_id, 10000 - level, 'adjustment', reference='bulk:10kg')
         db.session.commit()
 
 if __name__ == "__main__":
     set_all_product_stock_to_10kg()
 
+import logging
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from extensions import db
+from utils.cooperative import run_cpu_bound
+
+logger = logging.getLogger(__name__)
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -51,7 +59,7 @@ class User(UserMixin, db.Model):
             first_name=first_name,
             last_name=last_name,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=run_cpu_bound(generate_password_hash, password),
             phone=phone
         )
         db.session.add(user)
@@ -59,7 +67,7 @@ class User(UserMixin, db.Model):
         return user
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return run_cpu_bound(check_password_hash, self.password_hash, password)
 
     def update_profile(self, first_name, last_name, phone=''):
         self.first_name = first_name
@@ -68,20 +76,29 @@ class User(UserMixin, db.Model):
         db.session.commit()
 
     def change_password(self, new_password):
-        self.password_hash = generate_password_hash(new_password)
+        self.password_hash = run_cpu_bound(generate_password_hash, new_password)
         db.session.commit()
 
     def add_to_wishlist(self, product_id):
-        if not WishlistItem.query.filter_by(user_id=self.id, product_id=product_id).first():
-            wishlist_item = WishlistItem(user_id=self.id, product_id=product_id)
-            db.session.add(wishlist_item)
-            db.session.commit()
+        from utils.db import dialect_insert
+        # Let the unique constraint absorb duplicates instead of looking up first
+        stmt = dialect_insert(WishlistItem.__table__).values(
+            user_id=self.id, product_id=product_id, created_at=datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=['user_id', 'product_id'])
+        db.session.execute(stmt)
+        db.session.commit()
 
     def remove_from_wishlist(self, product_id):
-        wishlist_item = WishlistItem.query.filter_by(user_id=self.id, product_id=product_id).first()
-        if wishlist_item:
-            db.session.delete(wishlist_item)
-            db.session.commit()
+        WishlistItem.query.filter_by(user_id=self.id, product_id=product_id).delete()
+        db.session.commit()
+
+# Case-insensitive prefix search for the admin customer list
+db.Index('ix_users_email_lower', db.func.lower(User.__table__.c.email).label('email_lower'),
+         postgresql_ops={'email_lower': 'text_pattern_ops'})
+db.Index('ix_users_first_name_lower', db.func.lower(User.__table__.c.first_name).label('first_name_lower'),
+         postgresql_ops={'first_name_lower': 'text_pattern_ops'})
+db.Index('ix_users_last_name_lower', db.func.lower(User.__table__.c.last_name).label('last_name_lower'),
+         postgresql_ops={'last_name_lower': 'text_pattern_ops'})
 
 class Category(db.Model):
     __tablename__ = 'categories'
@@ -108,6 +125,8 @@ class Category(db.Model):
         )
         db.session.add(category)
         db.session.commit()
+        from utils import events
+        events.publish('category', [category.id])
         return category
 
 class Product(db.Model):
@@ -129,32 +148,20 @@ class Product(db.Model):
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     wishlist_items = db.relationship('WishlistItem', backref='product', lazy=True)
 
-    @staticmethod
-    def get_all(category=None, search=None, limit=20, offset=0):
-        query = Product.query.filter_by(status='active')
-        
-        if category:
-            query = query.filter(Product.category_id == category)
-        
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Product.name.ilike(search_term),
-                    Product.description.ilike(search_term)
-                )
-            )
-        
-        return query.offset(offset).limit(limit).all()
+    # Storefront filters and sorts all start from status='active'
+    __table_args__ = (
+        db.Index('ix_products_status_category', 'status', 'category_id'),
+        db.Index('ix_products_status_price', 'status', 'price'),
+        db.Index('ix_products_status_created_at', 'status', 'created_at'),
+        # Admin grid sorts across every status
+        db.Index('ix_products_name', 'name'),
+        db.Index('ix_products_price', 'price'),
+    )
 
     @staticmethod
     def get_by_id(product_id):
         return Product.query.get(product_id)
 
-    @staticmethod
-    def get_admin_products():
-        return Product.query.all()
-
     @staticmethod
     def create_product(name, description, price, category_id, stock_quantity, sku, image=None, original_price=None):
         product = Product(
@@ -168,24 +175,144 @@ class Product(db.Model):
             image=image or ''
         )
         db.session.add(product)
+        db.session.flush()
+        Product.refresh_pages([product.id])
         db.session.commit()
+        Product.after_change([product.id])
         return product
 
-    def update(self, name, description, price, category_id, stock_quantity, sku, image=None, original_price=None):
+    @staticmethod
+    def refresh_pages(product_ids):
+        # Rebuild the storefront read model in the caller's transaction; call before committing
+        from utils import product_pages
+        product_pages.refresh(product_ids)
+
+    @staticmethod
+    def after_change(product_ids):
+        # Tell every worker's caches derived from product rows; call after committing
+        from utils import events
+        events.publish('product', product_ids)
+
+    def update(self, name, description, price, category_id, stock_quantity, sku, image=None, original_price=None, stock_baseline=None):
+        from utils.inventory import get_stock_level, record_movement
         self.name = name
         self.description = description
         self.price = price
         self.original_price = original_price
         self.category_id = category_id
-        self.stock_quantity = stock_quantity
+        # Record the change against the level the editor saw, so sales made meanwhile are kept
+        if stock_baseline is None:
+            stock_baseline = get_stock_level(self.id)
+        if stock_quantity != stock_baseline:
+            record_movement(self.id, stock_quantity - stock_baseline, 'adjustment', reference='admin')
         self.sku = sku
         if image:
             self.image = image
+        Product.refresh_pages([self.id])
         db.session.commit()
+        Product.after_change([self.id])
 
     def delete(self):
         self.status = 'inactive'
+        Product.refresh_pages([self.id])
         db.session.commit()
+        Product.after_change([self.id])
+
+class ProductPage(db.Model):
+    __tablename__ = 'product_pages'
+    # Related products shown on a product page: the first active ones in its category
+    RELATED_LIMIT = 4
+
+    # Denormalized storefront copy of a product, rebuilt by utils.product_pages in the
+    # same transaction as every write to the product, so listings and the product
+    # page render from this table alone
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    id = db.synonym('product_id')
+    status = db.Column(db.String(20), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    sku = db.Column(db.String(50), nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    original_price = db.Column(db.Numeric(10, 2))
+    discount_percent = db.Column(db.Integer)
+    # Stock is the exception: sales only flip in_stock, and stock_quantity is the
+    # level as of the last inventory compaction. Show quantities from the ledger
+    stock_quantity = db.Column(db.Integer, nullable=False, default=0)
+    in_stock = db.Column(db.Boolean, nullable=False, default=False)
+    # Live and archived units sold, as of the last compaction or rebuild of this page
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    image_url = db.Column(db.String(255))
+    category_id = db.Column(db.Integer, nullable=False)
+    category_name = db.Column(db.String(50), nullable=False)
+    category_slug = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Storefront filters and sorts all start from status='active'
+    __table_args__ = (
+        db.Index('ix_product_pages_status_category', 'status', 'category_id', 'product_id'),
+        db.Index('ix_product_pages_status_price', 'status', 'price'),
+        db.Index('ix_product_pages_status_created_at', 'status', 'created_at'),
+        db.Index('ix_product_pages_status_units_sold', 'status', 'units_sold', 'product_id'),
+        # Admin grid stock sort
+        db.Index('ix_product_pages_stock_quantity', 'stock_quantity', 'product_id'),
+    )
+
+    @staticmethod
+    def get_all(category=None, search=None, limit=20, offset=0, price_range=None, in_stock=False, discounted=False, sort=None):
+        query = ProductPage.query.filter_by(status='active')
+
+        if category:
+            query = query.filter(ProductPage.category_id == category)
+
+        if search:
+            search_term = f"%{search}%"
+            query = query.filter(
+                db.or_(
+                    ProductPage.name.ilike(search_term),
+                    ProductPage.description.ilike(search_term)
+                )
+            )
+
+        if price_range:
+            low, high = price_range
+            if low is not None:
+                query = query.filter(ProductPage.price >= low)
+            if high is not None:
+                query = query.filter(ProductPage.price < high)
+
+        if in_stock:
+            query = query.filter(ProductPage.in_stock.is_(True))
+
+        if discounted:
+            query = query.filter(ProductPage.discount_percent.isnot(None))
+
+        if sort == 'price_asc':
+            query = query.order_by(ProductPage.price, ProductPage.product_id)
+        elif sort == 'price_desc':
+            query = query.order_by(ProductPage.price.desc(), ProductPage.product_id)
+        elif sort == 'newest':
+            query = query.order_by(ProductPage.created_at.desc(), ProductPage.product_id.desc())
+        elif sort == 'popular':
+            query = query.order_by(ProductPage.units_sold.desc(), ProductPage.product_id)
+        else:
+            query = query.order_by(ProductPage.product_id)
+
+        return query.offset(offset).limit(limit).all()
+
+    @staticmethod
+    def get_by_id(product_id):
+        return db.session.get(ProductPage, product_id)
+
+    def get_related(self):
+        """The first active products of this one's category, itself excluded"""
+        # Resolved per read from ix_product_pages_status_category, so no write to one
+        # product has to rewrite the rest of its category
+        return ProductPage.query.filter(
+            ProductPage.status == 'active',
+            ProductPage.category_id == self.category_id,
+            ProductPage.product_id != self.product_id
+        ).order_by(ProductPage.product_id).limit(ProductPage.RELATED_LIMIT).all()
 
 class Order(db.Model):
     __tablename__ = 'orders'
@@ -205,45 +332,124 @@ class Order(db.Model):
     billing_address = db.relationship('Address', foreign_keys=[billing_address_id])
 
     @staticmethod
-    def create_order(user_id, items, shipping_address_id, billing_address_id, total_amount, payment_method, payment_status, status):
-        print(f"[DEBUG] create_order called for user {user_id} with {len(items)} items.")
-        order = Order(
-            user_id=user_id,
-            total_amount=total_amount,
-            shipping_address_id=shipping_address_id,
-            billing_address_id=billing_address_id,
-            payment_status=payment_status,
-            status=status
-        )
-        # Store payment method as a string in a new column if not present, or as a note (for now, as attribute)
-        order.payment_method = payment_method
-        db.session.add(order)
-        db.session.flush()  # Get the order ID
-        print(f"[DEBUG] Order created with ID {order.id}")
-
-        # Add order items and reduce stock
+    def create_order(user_id, items, shipping_address_id, billing_address_id, total_amount, payment_method, payment_status, status, idempotency_key=None):
+        logger.debug('create_order called', extra={'user_id': user_id, 'item_count': len(items)})
+        from utils.inventory import checkout_holder, claim_stock, settle_claim, release_reservations, record_movement
+        if idempotency_key:
+            existing = Order.get_by_idempotency_key(user_id, idempotency_key)
+            if existing:
+                return existing
+
+        # Refuse the whole order rather than take any product below zero; raises InsufficientStock
+        quantities = {}
         for item in items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item['product_id'],
-                quantity=item['quantity'],
-                price=item['price']
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+        claim = checkout_holder(user_id, idempotency_key)
+        claim_stock(quantities, claim)
+        try:
+            checkout_request = None
+            if idempotency_key:
+                # Claim the key before writing the order; a concurrent duplicate blocks
+                # on the unique index and then fails here instead of placing a second order
+                checkout_request = CheckoutRequest(idempotency_key=idempotency_key, user_id=user_id)
+                db.session.add(checkout_request)
+                try:
+                    db.session.flush()
+                except IntegrityError:
+                    db.session.rollback()
+                    # The claim was shared with the order that won, which has settled it
+                    existing = Order.get_by_idempotency_key(user_id, idempotency_key)
+                    if existing:
+                        return existing
+                    raise
+
+            order = Order(
+                user_id=user_id,
+                total_amount=total_amount,
+                shipping_address_id=shipping_address_id,
+                billing_address_id=billing_address_id,
+                payment_status=payment_status,
+                status=status
             )
-            db.session.add(order_item)
-            # Reduce stock
-            product = Product.query.get(item['product_id'])
-            if product:
-                old_stock = product.stock_quantity
-                product.stock_quantity = max(0, product.stock_quantity - item['quantity'])
-                db.session.add(product)
-                print(f"[DEBUG] Reduced stock for product {product.id}: {old_stock} -> {product.stock_quantity}")
+            # Store payment method as a string in a new column if not present, or as a note (for now, as attribute)
+            order.payment_method = payment_method
+            db.session.add(order)
+            db.session.flush()  # Get the order ID
+            logger.debug('order created', extra={'order_id': order.id, 'user_id': user_id})
+            if checkout_request:
+                checkout_request.order_id = order.id
+            CustomerStats.record_order(user_id, total_amount, order.created_at)
+
+            # Add order items and record the stock movements; they replace the claim
+            for item in items:
+                order_item = OrderItem(
+                    order_id=order.id,
+                    product_id=item['product_id'],
+                    quantity=item['quantity'],
+                    price=item['price']
+                )
+                db.session.add(order_item)
+                record_movement(item['product_id'], -item['quantity'], 'sale', reference=f'order:{order.id}')
+            settle_claim(claim)
 
-        db.session.commit()
+            # Side effects run in the job worker once this transaction commits
+            from utils.jobs import enqueue
+            enqueue('send_order_confirmation', order_id=order.id)
+            enqueue('check_low_stock', product_ids=[item['product_id'] for item in items])
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            release_reservations(claim)
+            raise
         return order
 
     @staticmethod
-    def get_user_orders(user_id):
-        return Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
+    def get_by_idempotency_key(user_id, idempotency_key):
+        return Order.query.join(CheckoutRequest, CheckoutRequest.order_id == Order.id).filter(
+            CheckoutRequest.idempotency_key == idempotency_key,
+            CheckoutRequest.user_id == user_id
+        ).first()
+
+    @staticmethod
+    def get_user_orders(user_id, limit=None, before_id=None):
+        # Newest first; ids grow with created_at so the id doubles as a keyset cursor.
+        # Archived orders keep their ids, so both tables page on the same cursor.
+        orders = []
+        for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+            query = model.query.filter_by(user_id=user_id).options(
+                db.selectinload(model.items).joinedload(item_model.product),
+                db.joinedload(model.shipping_address)
+            )
+            if before_id:
+                query = query.filter(model.id < before_id)
+            query = query.order_by(model.id.desc())
+            if limit:
+                query = query.limit(limit)
+            orders.extend(query.all())
+        orders.sort(key=lambda order: order.id, reverse=True)
+        return orders[:limit] if limit else orders
+
+    @staticmethod
+    def get_user_order_summaries(user_id, limit=5):
+        """Lightweight order rows with an item count, for previews"""
+        rows = []
+        for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+            item_count = db.func.count(item_model.id).label('item_count')
+            rows.extend(db.session.query(
+                model.id, model.created_at, model.total_amount, model.status, item_count
+            ).outerjoin(item_model, item_model.order_id == model.id) \
+                .filter(model.user_id == user_id) \
+                .group_by(model.id) \
+                .order_by(model.id.desc()) \
+                .limit(limit).all())
+        rows.sort(key=lambda row: row.id, reverse=True)
+        return rows[:limit]
+
+    @staticmethod
+    def get_any(order_id):
+        """An order by id from the live table or, failing that, the archive"""
+        return db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
 
     @staticmethod
     def get_all_orders():
@@ -258,6 +464,171 @@ class OrderItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_order_items_product_id', 'product_id'),
+        db.Index('ix_order_items_order_id', 'order_id'),
+    )
+
+    @staticmethod
+    def units_sold(product_ids=None):
+        """Units sold per product across live and archived orders, as a (product_id, sold) subquery"""
+        live = db.select(OrderItem.product_id, OrderItem.quantity)
+        archived = db.select(ArchivedOrderItem.product_id, ArchivedOrderItem.quantity)
+        if product_ids is not None:
+            live = live.where(OrderItem.product_id.in_(product_ids))
+            archived = archived.where(ArchivedOrderItem.product_id.in_(product_ids))
+        items = db.union_all(live, archived).subquery()
+        return db.select(items.c.product_id, db.func.sum(items.c.quantity).label('sold')) \
+            .group_by(items.c.product_id).subquery()
+
+class ArchivedOrder(db.Model):
+    __tablename__ = 'archived_orders'
+
+    # Cold copy of orders moved out by utils.archive; rows keep their original ids
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    total_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    status = db.Column(db.String(20))
+    payment_status = db.Column(db.String(20))
+    shipping_address_id = db.Column(db.Integer, db.ForeignKey('addresses.id'))
+    billing_address_id = db.Column(db.Integer, db.ForeignKey('addresses.id'))
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    items = db.relationship('ArchivedOrderItem', backref='order', lazy=True)
+    user = db.relationship('User')
+    shipping_address = db.relationship('Address', foreign_keys=[shipping_address_id])
+    billing_address = db.relationship('Address', foreign_keys=[billing_address_id])
+
+    __table_args__ = (db.Index('ix_archived_orders_user_id_id', 'user_id', 'id'),)
+
+class ArchivedOrderItem(db.Model):
+    __tablename__ = 'archived_order_items'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('archived_orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+
+    product = db.relationship('Product')
+
+    __table_args__ = (db.Index('ix_archived_order_items_product_id', 'product_id'),)
+
+class CheckoutRequest(db.Model):
+    __tablename__ = 'checkout_requests'
+
+    # One row per checkout form submission token; the unique key makes replays resolve to the same order.
+    # Keys are only unique per user, so one customer's token can never collide with another's
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ux_checkout_requests_user_key', 'user_id', 'idempotency_key', unique=True),)
+
+class CustomerStats(db.Model):
+    __tablename__ = 'customer_stats'
+
+    # Lifetime order aggregates, kept current by Order.create_order so the admin
+    # customer list can sort on them without grouping the orders table
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    last_order_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_customer_stats_total_spent', 'total_spent', 'user_id'),
+        db.Index('ix_customer_stats_order_count', 'order_count', 'user_id'),
+        db.Index('ix_customer_stats_last_order_at', 'last_order_at', 'user_id'),
+    )
+
+    @staticmethod
+    def record_order(user_id, amount, ordered_at):
+        from utils.db import dialect_insert
+        table = CustomerStats.__table__
+        stmt = dialect_insert(table).values(
+            user_id=user_id, order_count=1, total_spent=amount, last_order_at=ordered_at
+        )
+        stmt = stmt.on_conflict_do_update(index_elements=['user_id'], set_={
+            'order_count': table.c.order_count + 1,
+            'total_spent': table.c.total_spent + stmt.excluded.total_spent,
+            'last_order_at': stmt.excluded.last_order_at,
+        })
+        db.session.execute(stmt)
+
+    @staticmethod
+    def counted_orders():
+        """Live and archived orders that count toward the stats, as a subquery"""
+        return db.union_all(
+            db.select(Order.user_id, Order.total_amount, Order.created_at),
+            db.select(ArchivedOrder.user_id, ArchivedOrder.total_amount, ArchivedOrder.created_at)
+        ).subquery()
+
+    @staticmethod
+    def rebuild():
+        """Recompute every customer's stats from live and archived orders; returns the row count"""
+        orders = CustomerStats.counted_orders()
+        source = db.select(
+            orders.c.user_id,
+            db.func.count(),
+            db.func.sum(orders.c.total_amount),
+            db.func.max(orders.c.created_at)
+        ).group_by(orders.c.user_id)
+        CustomerStats.query.delete()
+        result = db.session.execute(db.insert(CustomerStats).from_select(
+            ['user_id', 'order_count', 'total_spent', 'last_order_at'], source
+        ))
+        db.session.commit()
+        return result.rowcount
+
+class StockMovement(db.Model):
+    __tablename__ = 'stock_movements'
+
+    # Append-only; products.stock_quantity is the compacted snapshot these deltas apply to
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)  # signed delta
+    kind = db.Column(db.String(20), nullable=False)  # sale, restock, adjustment
+    reference = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StockReservation(db.Model):
+    __tablename__ = 'stock_reservations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    holder = db.Column(db.String(64), nullable=False)  # user:<id> or guest:<token>
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (db.UniqueConstraint('product_id', 'holder'),)
+
+class ServerSession(db.Model):
+    __tablename__ = 'sessions'
+
+    sid = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_jobs_queue_status_run_at', 'queue', 'status', 'run_at'),)
+
 class Address(db.Model):
     __tablename__ = 'addresses'
     
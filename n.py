@@ -0,0 +1,19 @@
+# Bulk update script: Set all product stock to 10kg (10000g)
+
+
+
+def set_all_product_stock_to_10kg():
+    from extensions import db
+    from app import app
+    with app.app_context():
+        from models import Product
+        from utils.inventory import get_stock_levels, record_movement
+        product_ids = [product_id for (product_id,) in db.session.query(Product.id)]
+        # Record adjustments in the ledger so concurrent sales are not overwritten
+        for product_id, level in get_stock_levels(product_ids).items():
+            if level != 10000:
+                record_movement(product_id, 10000 - level, 'adjustment', reference='bulk:10kg')
+        db.session.commit()
+
+if __name__ == "__main__":
+    set_all_product_stock_to_10kg()
@@ -1,10 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+import hmac
+import os
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, abort, send_from_directory
 from flask_login import login_required, current_user
 from functools import wraps
-from models import Product, Category, Order, User
+from models import Product, Category, Order, User, CustomerStats
 from forms import ProductForm, CategoryForm
 from sqlalchemy import func
 from extensions import db
+from utils.inventory import get_stock_level
+from utils.db import read_replica
+from utils import metrics
+from utils.profiler import request_profiler
+from utils import product_grid, customers as customer_list
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -20,10 +27,19 @@ def admin_required(f):
 @admin_bp.route('/')
 @login_required
 @admin_required
+@read_replica
 def dashboard():
     # Get dashboard statistics
-    total_orders = Order.query.count()
-    total_revenue = db.session.query(func.sum(Order.total_amount)).scalar() or 0
+    # Lifetime totals come from the per-customer stats, which also cover archived orders
+    total_orders, total_revenue = db.session.query(
+        func.sum(CustomerStats.order_count), func.sum(CustomerStats.total_spent)
+    ).one()
+    if total_orders is None:
+        # No stats rows yet (the startup backfill has not run); total the orders themselves
+        orders = CustomerStats.counted_orders()
+        total_orders, total_revenue = db.session.query(func.count(), func.sum(orders.c.total_amount)).one()
+    total_orders = total_orders or 0
+    total_revenue = total_revenue or 0
     total_users = User.query.count()
     total_products = Product.query.count()
     
@@ -43,14 +59,46 @@ def dashboard():
 @login_required
 @admin_required
 def products():
-    products = Product.get_admin_products()
     form = ProductForm()
     
-    # Populate category choices
+    # Populate category choices; rows are loaded page by page from products_data
     categories = Category.get_all()
     form.category.choices = [(str(cat.id), cat.name) for cat in categories]
     
-    return render_template('admin/products.html', products=products, form=form)
+    return render_template('admin/products.html', categories=categories, form=form)
+
+@admin_bp.route('/products/data')
+@login_required
+@admin_required
+@read_replica
+def products_data():
+    try:
+        page = product_grid.query_page(
+            search=request.args.get('q', '').strip() or None,
+            status=request.args.get('status'),
+            category_id=request.args.get('category', type=int),
+            sort=request.args.get('sort', 'id'),
+            descending=request.args.get('dir') == 'desc',
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', product_grid.PAGE_SIZE, type=int)
+        )
+    except product_grid.GridError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(page)
+
+@admin_bp.route('/products/bulk', methods=['POST'])
+@login_required
+@admin_required
+def bulk_products():
+    data = request.get_json(silent=True) or {}
+    try:
+        updated = product_grid.bulk_update(
+            data.get('ids') or [], data.get('action'), data.get('value'), actor=current_user.id
+        )
+    except product_grid.GridError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'updated': updated})
 
 @admin_bp.route('/products/new', methods=['GET', 'POST'])
 @login_required
@@ -88,6 +136,10 @@ def edit_product(product_id):
     categories = Category.get_all()
     form.category.choices = [(str(c.id), c.name) for c in categories]
     form.category.data = str(product.category_id)
+    if request.method == 'GET':
+        # Edit stock relative to the live ledger level rather than the compacted snapshot
+        form.stock_quantity.data = get_stock_level(product.id)
+        form.stock_baseline.data = form.stock_quantity.data
     
     if form.validate_on_submit():
         try:
@@ -98,7 +150,8 @@ def edit_product(product_id):
                 category_id=int(form.category.data),
                 stock_quantity=form.stock_quantity.data,
                 sku=form.sku.data,
-                image=form.image.data or ''
+                image=form.image.data or '',
+                stock_baseline=int(form.stock_baseline.data) if form.stock_baseline.data else None
             )
             flash('Product updated successfully!', 'success')
             return redirect(url_for('admin.products'))
@@ -132,7 +185,9 @@ def reactivate_product(product_id):
         
         if product.status == 'inactive':
             product.status = 'active'
+            Product.refresh_pages([product.id])
             db.session.commit()
+            Product.after_change([product.id])
             flash('Product reactivated successfully!', 'success')
             return jsonify({'success': True})
         else:
@@ -176,13 +231,56 @@ def orders():
 @admin_bp.route('/customers')
 @login_required
 @admin_required
+@read_replica
 def customers():
-    customers = User.query.filter_by(role='user').all()
-    return render_template('admin/customers.html', customers=customers)
+    search = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'joined')
+    if sort not in customer_list.SORTS:
+        sort = 'joined'
+    try:
+        customers, next_cursor = customer_list.query_page(search, sort, request.args.get('after'))
+    except ValueError:
+        abort(400)
+    return render_template(
+        'admin/customers.html',
+        customers=customers,
+        next_cursor=next_cursor,
+        search=search,
+        sort=sort,
+        sorts=customer_list.SORTS,
+        summary=customer_list.get_summary()
+    )
 
 @admin_bp.route('/orders/<int:order_id>')
 @login_required
 @admin_required
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
-    return render_template('admin/order_detail.html', order=order)
\ No newline at end of file
+    # Old orders may have been moved to the archive tables
+    order = Order.get_any(order_id)
+    if order is None:
+        abort(404)
+    return render_template('admin/order_detail.html', order=order)
+
+@admin_bp.route('/metrics')
+def metrics_endpoint():
+    # Scrapers authenticate with METRICS_TOKEN; admins can view it from a browser session
+    token = os.environ.get('METRICS_TOKEN')
+    auth = request.headers.get('Authorization', '')
+    token_ok = bool(token) and hmac.compare_digest(auth, f'Bearer {token}')
+    if not token_ok and not (current_user.is_authenticated and current_user.role == 'admin'):
+        abort(403)
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/profiles')
+@login_required
+@admin_required
+def profiles():
+    return render_template('admin/profiles.html', profiles=request_profiler.list_profiles())
+
+@admin_bp.route('/profiles/<name>')
+@login_required
+@admin_required
+def download_profile(name):
+    if not request_profiler.is_profile(name):
+        abort(404)
+    return send_from_directory(request_profiler.directory, name, as_attachment=True)
@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+from decimal import Decimal
+from datetime import datetime
+from flask import Blueprint, Response, request
+from models import Product, Category
+from extensions import db
+from utils.db import read_replica
+from utils import autocomplete as autocomplete_index
+from utils.compression import skip_compression
+from utils.inventory import get_stock_levels
+
+api_bp = Blueprint('api', __name__)
+
+PRODUCT_FIELDS = {
+    'id': Product.id,
+    'name': Product.name,
+    'description': Product.description,
+    'price': Product.price,
+    'original_price': Product.original_price,
+    'category_id': Product.category_id,
+    # The ledger level, filled in by _documents; the column is only the compacted snapshot
+    'stock_quantity': None,
+    'sku': Product.sku,
+    'image': Product.image,
+    'created_at': Product.created_at,
+}
+DEFAULT_PRODUCT_FIELDS = ('id', 'name', 'price', 'original_price', 'category_id', 'stock_quantity', 'sku', 'image')
+CATEGORY_FIELDS = ('id', 'name', 'slug', 'description')
+MAX_LIMIT = 100
+# Bodies smaller than this are sent uncompressed; gzip would barely help
+GZIP_MIN_SIZE = 1024
+
+
+def _encode(value):
+    # Prices stay exact strings rather than lossy floats
+    if isinstance(value, Decimal):
+        return format(value, 'f')
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def _json_response(payload, status=200):
+    body = json.dumps(payload, separators=(',', ':'), default=_encode).encode()
+    response = Response(body, status=status, mimetype='application/json')
+    if status != 200:
+        return response
+
+    response.set_etag(hashlib.sha1(body).hexdigest(), weak=True)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    if response.status_code == 200 and len(body) >= GZIP_MIN_SIZE \
+            and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def _error(message, status):
+    return _json_response({'error': message}, status=status)
+
+
+def _columns(fields):
+    return [PRODUCT_FIELDS[f].label(f) for f in fields if PRODUCT_FIELDS[f] is not None]
+
+
+def _documents(rows, fields):
+    levels = get_stock_levels([row.id for row in rows]) if 'stock_quantity' in fields else {}
+    documents = []
+    for row in rows:
+        values = row._asdict()
+        documents.append({f: levels.get(row.id, 0) if f == 'stock_quantity' else values[f] for f in fields})
+    return documents
+
+
+def _selected_fields(default):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(default)
+    selected = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in selected if f not in PRODUCT_FIELDS]
+    if unknown:
+        return None
+    # The id is always included so clients can page and link
+    return ['id'] + [f for f in selected if f != 'id']
+
+
+@api_bp.route('/products')
+@skip_compression
+@read_replica
+def products():
+    fields = _selected_fields(DEFAULT_PRODUCT_FIELDS)
+    if fields is None:
+        return _error(f'Unknown field; choose from {", ".join(PRODUCT_FIELDS)}', 400)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_LIMIT)
+    cursor = request.args.get('cursor', type=int)
+    category = request.args.get('category', type=int)
+    search = request.args.get('search')
+
+    # Project only the requested columns; no ORM objects are built
+    query = db.session.query(*_columns(fields)).filter(Product.status == 'active')
+    if category:
+        query = query.filter(Product.category_id == category)
+    if search:
+        search_term = f"%{search}%"
+        query = query.filter(db.or_(Product.name.ilike(search_term), Product.description.ilike(search_term)))
+    if cursor:
+        query = query.filter(Product.id > cursor)
+    rows = query.order_by(Product.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return _json_response({
+        'data': _documents(rows, fields),
+        'next_cursor': str(rows[-1].id) if has_more else None,
+    })
+
+
+@api_bp.route('/products/<int:product_id>')
+@skip_compression
+@read_replica
+def product_detail(product_id):
+    fields = _selected_fields(PRODUCT_FIELDS)
+    if fields is None:
+        return _error(f'Unknown field; choose from {", ".join(PRODUCT_FIELDS)}', 400)
+    row = db.session.query(*_columns(fields)) \
+        .filter(Product.id == product_id, Product.status == 'active').first()
+    if row is None:
+        return _error('Product not found', 404)
+    return _json_response({'data': _documents([row], fields)[0]})
+
+
+@api_bp.route('/categories')
+@skip_compression
+@read_replica
+def categories():
+    columns = [getattr(Category, f).label(f) for f in CATEGORY_FIELDS]
+    rows = db.session.query(*columns).order_by(Category.id).all()
+    return _json_response({'data': [row._asdict() for row in rows]})
+
+
+@api_bp.route('/autocomplete')
+@skip_compression
+def autocomplete():
+    # Served from the in-process prefix index; no database round trip
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 8, type=int), 1), autocomplete_index.MAX_RESULTS)
+    results = autocomplete_index.search(query, limit) if query else []
+    return _json_response({'query': query, 'data': results})
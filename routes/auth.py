@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User
 from forms import LoginForm, RegisterForm
+from utils.helpers import merge_guest_cart
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -15,6 +16,10 @@ def login():
         user = User.get_by_email(form.email.data)
         if user and user.check_password(form.password.data):
             login_user(user, remember=True)
+            if merge_guest_cart(user.id):
+                flash('Some items in your cart were reduced to the stock available.', 'warning')
+            if hasattr(session, 'regenerate'):
+                session.regenerate()
             next_page = request.args.get('next')
             flash('Login successful!', 'success')
             return redirect(next_page) if next_page else redirect(url_for('main.index'))
@@ -39,6 +44,10 @@ def register():
         )
         if user:
             login_user(user, remember=True)
+            if merge_guest_cart(user.id):
+                flash('Some items in your cart were reduced to the stock available.', 'warning')
+            if hasattr(session, 'regenerate'):
+                session.regenerate()
             flash('Registration successful! Welcome to Deli Spi!', 'success')
             return redirect(url_for('main.index'))
         else:
@@ -1,22 +1,33 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_required, current_user
-from models import Product, Category, Order, Address
+from models import ProductPage, Order, Address
 from forms import ContactForm, ProfileForm, ChangePasswordForm, AddressForm, CheckoutForm
-from utils.helpers import get_cart_items, clear_cart
+from utils.helpers import get_cart_items, get_cart_summary, get_categories, clear_cart
+from utils.jobs import enqueue
+from utils.db import read_replica
+from utils.inventory import InsufficientStock
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
+@read_replica
 def index():
-    featured_products = Product.get_all(limit=8)
-    categories = Category.get_all()
+    featured_products = ProductPage.get_all(limit=8)
+    categories = get_categories()
     return render_template('index.html', featured_products=featured_products, categories=categories)
 
 @main_bp.route('/contact', methods=['GET', 'POST'])
 def contact():
     form = ContactForm()
     if form.validate_on_submit():
-        # Here you would typically send email or save to database
+        enqueue(
+            'send_contact_message',
+            name=form.name.data,
+            email=form.email.data,
+            subject=form.subject.data,
+            message=form.message.data,
+            commit=True
+        )
         flash('Thank you for your message! We will get back to you soon.', 'success')
         return redirect(url_for('main.contact'))
     
@@ -25,8 +36,8 @@ def contact():
 @main_bp.route('/profile')
 @login_required
 def profile():
-    user_orders = Order.get_user_orders(current_user.id)
-    return render_template('user/profile.html', orders=user_orders[:5])
+    user_orders = Order.get_user_order_summaries(current_user.id, limit=5)
+    return render_template('user/profile.html', orders=user_orders)
 
 @main_bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
@@ -68,8 +79,16 @@ def change_password():
 @main_bp.route('/orders')
 @login_required
 def orders():
-    user_orders = Order.get_user_orders(current_user.id)
-    return render_template('user/orders.html', orders=user_orders)
+    before = request.args.get('before', type=int)
+    per_page = 10
+
+    # Fetch one extra row to know whether an older page exists
+    user_orders = Order.get_user_orders(current_user.id, limit=per_page + 1, before_id=before)
+    next_cursor = None
+    if len(user_orders) > per_page:
+        user_orders = user_orders[:per_page]
+        next_cursor = user_orders[-1].id
+    return render_template('user/orders.html', orders=user_orders, next_cursor=next_cursor, before=before)
 
 @main_bp.route('/addresses')
 @login_required
@@ -138,6 +157,17 @@ def delete_address(address_id):
 @login_required
 def checkout():
     cart_items = get_cart_items()
+    # A replayed submission finds its order even though the cart was already cleared.
+    # Looked up after reading the cart: the order commits before the cart is cleared,
+    # so an empty cart here means a finished order is visible too
+    if request.method == 'POST':
+        idempotency_key = request.form.get('idempotency_key')
+        if idempotency_key:
+            existing_order = Order.get_by_idempotency_key(current_user.id, idempotency_key)
+            if existing_order:
+                flash('Order placed successfully! You will pay upon delivery.', 'success')
+                return redirect(url_for('main.orders'))
+
     if not cart_items:
         flash('Your cart is empty.', 'error')
         return redirect(url_for('products.cart'))
@@ -157,7 +187,7 @@ def checkout():
             flash('Only Cash on Delivery is available at this time.', 'error')
             return redirect(url_for('main.checkout'))
 
-        total = sum(item['subtotal'] for item in cart_items)
+        total = get_cart_summary()['total']
         # Get selected addresses
         shipping_addr_id = int(form.shipping_address.data)
         billing_addr_id = int(form.billing_address.data)
@@ -165,26 +195,32 @@ def checkout():
         billing_addr = next(a for a in user_addresses if a.id == billing_addr_id)
 
         # Create order with payment method and status
-        order = Order.create_order(
-            user_id=current_user.id,
-            items=[{
-                'product_id': item['product'].id,
-                'name': item['product'].name,
-                'price': item['product'].price,
-                'quantity': item['quantity'],
-                'subtotal': item['subtotal']
-            } for item in cart_items],
-            shipping_address_id=shipping_addr.id,
-            billing_address_id=billing_addr.id,
-            total_amount=total,
-            payment_method='Cash on Delivery',
-            payment_status='pending',
-            status='pending'
-        )
+        try:
+            order = Order.create_order(
+                user_id=current_user.id,
+                items=[{
+                    'product_id': item['product'].id,
+                    'name': item['product'].name,
+                    'price': item['product'].price,
+                    'quantity': item['quantity'],
+                    'subtotal': item['subtotal']
+                } for item in cart_items],
+                shipping_address_id=shipping_addr.id,
+                billing_address_id=billing_addr.id,
+                total_amount=total,
+                payment_method='Cash on Delivery',
+                payment_status='pending',
+                status='pending',
+                idempotency_key=form.idempotency_key.data
+            )
+        except InsufficientStock as e:
+            names = ', '.join(item['product'].name for item in cart_items if item['product'].id in e.shortages)
+            flash(f'Not enough stock left for: {names}. Please update your cart.', 'error')
+            return redirect(url_for('products.cart'))
 
         clear_cart()
         flash('Order placed successfully! You will pay upon delivery.', 'success')
         return redirect(url_for('main.orders'))
     
-    total = sum(item['subtotal'] for item in cart_items)
+    total = get_cart_summary()['total']
     return render_template('checkout.html', form=form, cart_items=cart_items, total=total)
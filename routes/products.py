@@ -1,8 +1,12 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_login import login_required, current_user
-from models import Product, Category
-from utils.helpers import get_cart_items, add_to_cart, update_cart_item, remove_from_cart
+from models import Product, ProductPage
+from utils.helpers import get_cart_items, get_cart_summary, get_categories, add_to_cart, update_cart_item, remove_from_cart, get_cart_holder, get_cart_quantity
+from utils.inventory import get_stock_level, get_stock_levels, get_available_stock
+from utils.db import read_replica
+from utils.facets import compute_facets, price_range, PRICE_BUCKETS, SORTS
+from utils.wishlist import get_wishlist_ids, is_in_wishlist, get_wishlist_page, toggle_wishlist
 
 products_bp = Blueprint('products', __name__)
 
@@ -12,36 +16,62 @@ def cart_count():
     return jsonify({'count': get_cart_count()})
 
 @products_bp.route('/')
+@read_replica
 def products():
     page = request.args.get('page', 1, type=int)
-    category = request.args.get('category')
+    category = request.args.get('category', type=int)
     search = request.args.get('search')
+    price = request.args.get('price')
+    in_stock = request.args.get('in_stock') == '1'
+    discounted = request.args.get('discounted') == '1'
+    sort = request.args.get('sort')
+    if not price_range(price):
+        price = None
     
     per_page = 12
     offset = (page - 1) * per_page
     
-    products = Product.get_all(category=category, search=search, limit=per_page, offset=offset)
-    categories = Category.get_all()
+    products = ProductPage.get_all(category=category, search=search, limit=per_page, offset=offset,
+                               price_range=price_range(price), in_stock=in_stock,
+                               discounted=discounted, sort=sort)
+    categories = get_categories()
+    wishlist_ids = get_wishlist_ids([p.id for p in products])
+    # Pages carry only an in_stock flag between compactions; quantities come from the ledger
+    stock_levels = get_stock_levels([p.id for p in products])
+    facets = compute_facets(search=search, category=category, price=price,
+                            in_stock=in_stock, discounted=discounted)
+    # Current filters, for building facet links that keep the others
+    filters = {k: v for k, v in {
+        'category': category, 'search': search, 'price': price,
+        'in_stock': '1' if in_stock else None, 'discounted': '1' if discounted else None,
+        'sort': sort
+    }.items() if v}
     
     return render_template('products.html', 
                          products=products, 
                          categories=categories,
+                         wishlist_ids=wishlist_ids,
+                         stock_levels=stock_levels,
                          selected_category=category,
                          search_query=search,
+                         facets=facets,
+                         filters=filters,
+                         price_buckets=PRICE_BUCKETS,
+                         sorts=SORTS,
                          page=page)
 
 @products_bp.route('/<int:product_id>')
+@read_replica
 def product_detail(product_id):
-    product = Product.get_by_id(product_id)
+    product = ProductPage.get_by_id(product_id)
     if not product:
         flash('Product not found.', 'error')
         return redirect(url_for('products.products'))
-    # Get related products from same category
-    related_products = Product.get_all(category=product.category_id, limit=4)
-    related_products = [p for p in related_products if p.id != product.id]
     return render_template('product_detail.html', 
                          product=product, 
-                         related_products=related_products)
+                         related_products=product.get_related(),
+                         stock_level=get_stock_level(product.id),
+                         in_wishlist=is_in_wishlist(product.id))
 
 @products_bp.route('/add-to-cart', methods=['POST'])
 def add_to_cart_route():
@@ -60,7 +90,8 @@ def add_to_cart_route():
         flash('Product not found.', 'error')
         return redirect(url_for('products.products'))
     
-    if quantity > product.stock_quantity:
+    in_cart = get_cart_quantity(str(product_id_int))
+    if in_cart + quantity > get_available_stock(product_id_int, get_cart_holder()):
         flash('Not enough stock available.', 'error')
         return redirect(url_for('products.product_detail', product_id=product_id))
     
@@ -75,8 +106,9 @@ def add_to_cart_route():
 @products_bp.route('/cart')
 def cart():
     cart_items = get_cart_items()
-    total = sum(item['subtotal'] for item in cart_items)
-    return render_template('cart.html', cart_items=cart_items, total=total)
+    total = get_cart_summary()['total']
+    stock_levels = get_stock_levels([item['product'].id for item in cart_items])
+    return render_template('cart.html', cart_items=cart_items, total=total, stock_levels=stock_levels)
 
 @products_bp.route('/update-cart', methods=['POST'])
 def update_cart():
@@ -95,7 +127,7 @@ def update_cart():
         flash('Item removed from cart.', 'info')
     else:
         product = Product.get_by_id(product_id_int)
-        if product and quantity <= product.stock_quantity:
+        if product and quantity <= get_available_stock(product_id_int, get_cart_holder()):
             update_cart_item(str(product_id_int), quantity)
             flash('Cart updated.', 'success')
         else:
@@ -114,6 +146,24 @@ def remove_from_cart_route(product_id):
         flash('Invalid product.', 'error')
     return redirect(url_for('products.cart'))
 
+@products_bp.route('/wishlist')
+@login_required
+def wishlist():
+    page = request.args.get('page', 1, type=int)
+    pagination = get_wishlist_page(page=page, per_page=12)
+    stock_levels = get_stock_levels([product.id for product in pagination.items])
+    return render_template('user/wishlist.html', products=pagination.items, pagination=pagination,
+                           stock_levels=stock_levels)
+
+@products_bp.route('/wishlist/toggle/<int:product_id>', methods=['POST'])
+@login_required
+def toggle_wishlist_route(product_id):
+    product = Product.get_by_id(product_id)
+    if not product:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    in_wishlist = toggle_wishlist(product_id)
+    return jsonify({'success': True, 'in_wishlist': in_wishlist})
+
 @products_bp.route('/wishlist/add/<product_id>')
 @login_required
 def add_to_wishlist(product_id):
@@ -46,7 +46,7 @@
         });
 
         // Wishlist buttons
-        const wishlistButtons = document.querySelectorAll('a[href*="wishlist"]');
+        const wishlistButtons = document.querySelectorAll('a[data-toggle-url]');
         wishlistButtons.forEach(button => {
             button.addEventListener('click', function(e) {
                 e.preventDefault();
@@ -201,16 +201,24 @@
 
     // Toggle wishlist
     function toggleWishlist(button) {
-        const isAdding = button.href.includes('add');
-        const productName = button.closest('.card').querySelector('.card-title')?.textContent || 'Item';
+        const productName = button.closest('.card')?.querySelector('.card-title')?.textContent || 'Item';
         
-        fetch(button.href, {
-            method: 'GET'
+        fetch(button.dataset.toggleUrl, {
+            method: 'POST',
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
         })
         .then(response => {
             if (response.ok) {
+                return response.json();
+            }
+            throw new Error('Failed to update wishlist');
+        })
+        .then(data => {
+            if (data.success) {
                 // Update button appearance
-                if (isAdding) {
+                if (data.in_wishlist) {
                     button.innerHTML = '<i data-feather="heart" fill="currentColor" size="16"></i> Remove from Wishlist';
                     button.href = button.href.replace('/add/', '/remove/');
                     button.classList.remove('btn-outline-secondary');
@@ -347,8 +355,10 @@
         if (!cartBadge) return;
         // Always fetch latest count from backend
         fetch('/products/cart-count')
-            .then(response => response.json())
+            // Keep the current badge when the server sheds or rate-limits the poll
+            .then(response => response.ok ? response.json() : null)
             .then(data => {
+                if (!data) return;
                 if (data.count > 0) {
                     cartBadge.textContent = data.count;
                     cartBadge.style.display = 'inline';
@@ -13,6 +13,7 @@
         initializeForms();
         initializeTooltips();
         initializeModals();
+        initializeAutocomplete();
         updateCartBadge();
     }
 
@@ -44,6 +45,50 @@
         }
     }
 
+    // Search-as-you-type suggestions
+    function initializeAutocomplete() {
+        document.querySelectorAll('input[data-autocomplete-url]').forEach(input => {
+            const menu = document.createElement('div');
+            menu.className = 'dropdown-menu w-100';
+            input.insertAdjacentElement('afterend', menu);
+            let timer = null;
+            let latest = 0;
+
+            input.addEventListener('input', function() {
+                clearTimeout(timer);
+                const query = input.value.trim();
+                if (!query) {
+                    menu.classList.remove('show');
+                    return;
+                }
+                timer = setTimeout(() => {
+                    const requestId = ++latest;
+                    fetch(`${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`)
+                        .then(response => response.json())
+                        .then(payload => {
+                            // Ignore answers to queries the user has already typed past
+                            if (requestId !== latest) return;
+                            menu.innerHTML = '';
+                            payload.data.forEach(item => {
+                                const link = document.createElement('a');
+                                link.className = 'dropdown-item';
+                                link.href = input.dataset.productUrl.replace(/0$/, item.id);
+                                link.textContent = item.name;
+                                const meta = document.createElement('small');
+                                meta.className = 'text-muted ms-2';
+                                meta.textContent = item.category || '';
+                                link.appendChild(meta);
+                                menu.appendChild(link);
+                            });
+                            menu.classList.toggle('show', payload.data.length > 0);
+                        });
+                }, 150);
+            });
+
+            input.addEventListener('blur', () => setTimeout(() => menu.classList.remove('show'), 200));
+        });
+    }
+
     // Alert functionality
     function initializeAlerts() {
         // Auto-dismiss alerts after 5 seconds
@@ -185,8 +230,10 @@
         const cartBadge = document.querySelector('.navbar .badge');
         if (cartBadge) {
             fetch('/products/cart-count')
-                .then(response => response.json())
+                // Keep the current badge when the server sheds or rate-limits the poll
+                .then(response => response.ok ? response.json() : null)
                 .then(data => {
+                    if (!data) return;
                     if (data.count > 0) {
                         cartBadge.textContent = data.count;
                         cartBadge.style.display = 'inline';
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+# app.py configures itself at import, so the scratch database must be set first
+_scratch = tempfile.mkdtemp(prefix='spice-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_scratch, 'app.db')
+os.environ['METRICS_DIR'] = os.path.join(_scratch, 'metrics')
+os.environ['TEMPLATE_CACHE_DIR'] = 'off'
+os.environ['RATE_LIMITING'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def customer(app):
+    """A fresh customer with one address; returns (email, password, user_id, address_id)"""
+    from extensions import db
+    from models import User, Address
+    email, password = f'{uuid.uuid4().hex[:12]}@example.com', 'password123'
+    with app.app_context():
+        user = User.create_user('Test', 'Customer', email, password)
+        address = Address(user_id=user.id, first_name='Test', last_name='Customer', address_line1='1 Spice Lane',
+                          city='Kochi', state='Kerala', postal_code='682001', country='India', is_default=True)
+        db.session.add(address)
+        db.session.commit()
+        return email, password, user.id, address.id
+
+
+@pytest.fixture
+def make_product(app):
+    def make(stock=1000, price=10, category_id=1, name='Test spice'):
+        from models import Product
+        with app.app_context():
+            product = Product.create_product(name=name, description='For tests', price=price,
+                                             category_id=category_id, stock_quantity=stock,
+                                             sku=uuid.uuid4().hex[:12])
+            return product.id
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """Returns a function that opens a new client logged in as (email, password)"""
+    def login(email, password):
+        client = app.test_client()
+        client.post('/auth/login', data={'email': email, 'password': password})
+        return client
+    return login
@@ -0,0 +1,20 @@
+from extensions import db
+from models import CustomerStats, Order
+
+
+def test_dashboard_totals_without_customer_stats(app, customer, login, make_product):
+    _, _, user_id, address_id = customer
+    product_id = make_product()
+    with app.app_context():
+        Order.create_order(user_id, [{'product_id': product_id, 'quantity': 100, 'price': 10}], address_id,
+                           address_id, 1000, 'Cash on Delivery', 'pending', 'pending')
+        expected = Order.query.count()
+        # As on a database upgraded before customer_stats existed
+        CustomerStats.query.delete()
+        db.session.commit()
+
+    body = login('admin@delispi.com', 'admin123').get('/admin/').get_data(as_text=True)
+
+    with app.app_context():
+        CustomerStats.rebuild()
+    assert f'<div class="card-value">{expected}</div>' in body
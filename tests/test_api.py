@@ -0,0 +1,15 @@
+from extensions import db
+
+
+def test_product_stock_is_the_ledger_level(app, client, make_product):
+    from utils.inventory import record_movement
+    product_id = make_product(stock=500)
+    with app.app_context():
+        record_movement(product_id, -120, 'sale')
+        db.session.commit()
+
+    detail = client.get(f'/api/v1/products/{product_id}').get_json()['data']
+    listing = client.get(f'/api/v1/products?cursor={product_id - 1}&limit=1&fields=name,stock_quantity').get_json()
+
+    assert detail['stock_quantity'] == 380
+    assert listing['data'] == [{'id': product_id, 'name': 'Test spice', 'stock_quantity': 380}]
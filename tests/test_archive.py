@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models import Order, OrderItem, ProductPage
+
+
+def test_archived_sales_still_count_as_popular(app, customer, make_product):
+    from utils import product_pages
+    from utils.archive import archive_orders
+    from utils.inventory import compact, record_movement
+    _, _, user_id, address_id = customer
+    best_seller = make_product(stock=10 ** 6, category_id=2)
+    with app.app_context():
+        order = Order(user_id=user_id, total_amount=10 ** 6, shipping_address_id=address_id,
+                      billing_address_id=address_id, status='completed',
+                      created_at=datetime.utcnow() - timedelta(days=400))
+        db.session.add(order)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=order.id, product_id=best_seller, quantity=10 ** 6, price=1))
+        record_movement(best_seller, -10 ** 6, 'sale', reference=f'order:{order.id}')
+        db.session.commit()
+        order_id = order.id
+
+        # Popularity reaches the read model when the sale is compacted, not at checkout
+        assert ProductPage.get_by_id(best_seller).units_sold == 0
+        compact()
+        assert ProductPage.get_all(category=2, sort='popular', limit=1)[0].product_id == best_seller
+
+        assert archive_orders(pause=0) >= 1
+        assert Order.query.filter_by(id=order_id).first() is None
+        # A rebuilt page counts the archived items too
+        product_pages.refresh([best_seller])
+        db.session.commit()
+        assert ProductPage.get_by_id(best_seller).units_sold == 10 ** 6
+        assert ProductPage.get_all(category=2, sort='popular', limit=1)[0].product_id == best_seller
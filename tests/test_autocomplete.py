@@ -0,0 +1,34 @@
+from extensions import db
+from models import Order, OrderItem
+
+
+def test_compacted_sales_rerank_without_a_rebuild(app, customer, make_product):
+    from utils import autocomplete
+    from utils.inventory import compact, record_movement
+    _, _, user_id, address_id = customer
+    first = make_product(name='Zedoary root')
+    second = make_product(name='Zedoary powder')
+    with app.app_context():
+        index = autocomplete.build_index()
+        assert [r['id'] for r in autocomplete.search('zedoary')] == [first, second]
+
+        order = Order(user_id=user_id, total_amount=10, shipping_address_id=address_id,
+                      billing_address_id=address_id, status='pending')
+        db.session.add(order)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=order.id, product_id=second, quantity=100, price=10))
+        record_movement(second, -100, 'sale', reference=f'order:{order.id}')
+        db.session.commit()
+        compact()
+
+        assert autocomplete.get_index() is index
+        assert [r['id'] for r in autocomplete.search('zedoary')] == [second, first]
+
+
+def test_search_falls_back_to_pages_until_the_index_is_built(app, make_product, monkeypatch):
+    from utils import autocomplete
+    product_id = make_product(name='Grains of paradise')
+    monkeypatch.setattr(autocomplete, '_index', None)
+    monkeypatch.setattr(autocomplete, '_refresher', object())
+    with app.app_context():
+        assert [r['id'] for r in autocomplete.search('paradise grains')] == [product_id]
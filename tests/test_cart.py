@@ -0,0 +1,38 @@
+from extensions import db
+from models import CartItem, StockReservation
+
+
+def _reservations(product_id):
+    return {r.holder: r.quantity for r in StockReservation.query.filter_by(product_id=product_id)}
+
+
+def test_login_moves_guest_reservations_to_the_user(app, client, customer, make_product):
+    email, password, user_id, _ = customer
+    product_id = make_product(stock=100)
+    client.post('/products/add-to-cart', data={'product_id': product_id, 'quantity': 60})
+
+    client.post('/auth/login', data={'email': email, 'password': password})
+
+    with app.app_context():
+        assert CartItem.query.filter_by(user_id=user_id, product_id=product_id).one().quantity == 60
+        assert _reservations(product_id) == {f'user:{user_id}': 60}
+
+
+def test_merged_quantity_is_capped_at_available_stock(app, client, customer, make_product):
+    from utils.inventory import reserve_stock
+    email, password, user_id, _ = customer
+    product_id = make_product(stock=100)
+    with app.app_context():
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=20))
+        db.session.commit()
+    client.post('/products/add-to-cart', data={'product_id': product_id, 'quantity': 70})
+    with app.app_context():
+        # Another shopper holds part of what the guest had
+        reserve_stock(product_id, 50, 'guest:someone-else')
+
+    response = client.post('/auth/login', data={'email': email, 'password': password}, follow_redirects=True)
+
+    assert 'reduced to the stock available' in response.get_data(as_text=True)
+    with app.app_context():
+        assert CartItem.query.filter_by(user_id=user_id, product_id=product_id).one().quantity == 50
+        assert _reservations(product_id)[f'user:{user_id}'] == 50
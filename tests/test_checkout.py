@@ -0,0 +1,119 @@
+import threading
+import pytest
+from extensions import db
+from models import CartItem, Order
+
+
+def _checkout(client, address_id, key):
+    return client.post('/checkout', data={
+        'idempotency_key': key, 'shipping_address': address_id, 'billing_address': address_id, 'payment_method': 'cod'
+    })
+
+
+def test_checkout_rejects_oversell(app, customer, login, make_product):
+    from utils.inventory import get_stock_level, record_movement
+    email, password, user_id, address_id = customer
+    product_id = make_product(stock=500)
+    with app.app_context():
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=400))
+        # Another order takes most of the stock after this cart was filled
+        record_movement(product_id, -300, 'sale')
+        db.session.commit()
+
+    response = _checkout(login(email, password), address_id, 'a' * 32)
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/products/cart')
+    with app.app_context():
+        assert Order.query.filter_by(user_id=user_id).count() == 0
+        assert get_stock_level(product_id) == 200
+
+
+def test_checkout_takes_stock(app, customer, login, make_product):
+    from utils.inventory import get_stock_level
+    email, password, user_id, address_id = customer
+    product_id = make_product(stock=500)
+    with app.app_context():
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=400))
+        db.session.commit()
+
+    response = _checkout(login(email, password), address_id, 'b' * 32)
+
+    assert response.headers['Location'].endswith('/orders')
+    with app.app_context():
+        assert Order.query.filter_by(user_id=user_id).count() == 1
+        assert get_stock_level(product_id) == 100
+
+
+def test_parallel_submissions_place_one_order(app, customer, login, make_product):
+    email, password, user_id, address_id = customer
+    product_id = make_product(stock=5000)
+    with app.app_context():
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=200))
+        db.session.commit()
+    clients = [login(email, password) for _ in range(8)]
+    statuses = []
+
+    def submit(client):
+        statuses.append(_checkout(client, address_id, 'c' * 32).status_code)
+
+    threads = [threading.Thread(target=submit, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        assert Order.query.filter_by(user_id=user_id).count() == 1
+    assert statuses == [302] * 8
+
+
+def test_late_duplicate_finds_the_order(app, customer, login, make_product):
+    email, password, user_id, address_id = customer
+    product_id = make_product()
+    with app.app_context():
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=200))
+        db.session.commit()
+    client = login(email, password)
+    assert _checkout(client, address_id, 'd' * 32).headers['Location'].endswith('/orders')
+
+    # The cart is empty now; the replay still lands on the order, not on the cart
+    response = _checkout(client, address_id, 'd' * 32)
+    assert response.headers['Location'].endswith('/orders')
+
+
+def test_same_key_from_another_user_places_its_own_order(app, customer, login, make_product):
+    from models import Address, User
+    email, password, user_id, address_id = customer
+    product_id = make_product()
+    with app.app_context():
+        other = User.create_user('Other', 'Customer', f'other-{email}', password)
+        other_address = Address(user_id=other.id, first_name='O', last_name='C', address_line1='2 Spice Lane',
+                                city='Kochi', state='Kerala', postal_code='682001', country='India')
+        db.session.add(other_address)
+        db.session.add_all([CartItem(user_id=user_id, product_id=product_id, quantity=200),
+                            CartItem(user_id=other.id, product_id=product_id, quantity=200)])
+        db.session.commit()
+        other_id, other_address_id = other.id, other_address.id
+
+    assert _checkout(login(email, password), address_id, 'e' * 32).status_code == 302
+    assert _checkout(login(f'other-{email}', password), other_address_id, 'e' * 32).status_code == 302
+    with app.app_context():
+        assert Order.query.filter_by(user_id=user_id).count() == 1
+        assert Order.query.filter_by(user_id=other_id).count() == 1
+
+
+def test_claims_refuse_the_later_of_two_checkouts(app, make_product):
+    from utils.inventory import InsufficientStock, claim_stock, checkout_holder, release_reservations
+    product_id = make_product(stock=500)
+    with app.app_context():
+        first = checkout_holder()
+        claim_stock({product_id: 300}, first)
+        with pytest.raises(InsufficientStock) as refused:
+            claim_stock({product_id: 300}, checkout_holder())
+        assert refused.value.shortages == {product_id: 200}
+        # A resubmitted form shares its claim instead of counting twice
+        claim_stock({product_id: 300}, first)
+
+        release_reservations(first)
+        claim_stock({product_id: 300}, checkout_holder())
@@ -0,0 +1,27 @@
+from extensions import db
+from models import CartItem, CustomerStats, Order
+
+
+def _place_order(app, login, customer, product_id, quantity=200):
+    email, password, user_id, address_id = customer
+    with app.app_context():
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=quantity))
+        db.session.commit()
+    login(email, password).post('/checkout', data={
+        'idempotency_key': 'f' * 32, 'shipping_address': address_id, 'billing_address': address_id, 'payment_method': 'cod'
+    })
+    with app.app_context():
+        return Order.query.filter_by(user_id=user_id).one().id
+
+
+def test_stats_are_backfilled_when_missing(app, customer, login, make_product):
+    from utils.customers import backfill_stats_if_empty
+    user_id = customer[2]
+    _place_order(app, login, customer, make_product())
+    with app.app_context():
+        CustomerStats.query.delete()
+        db.session.commit()
+
+        backfill_stats_if_empty()
+
+        assert db.session.get(CustomerStats, user_id).order_count == 1
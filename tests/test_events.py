@@ -0,0 +1,30 @@
+from utils import events
+
+
+class _Transport:
+    """Issues versions like the database sequence and swallows sends"""
+
+    def __init__(self):
+        self.version = 0
+
+    def next_version(self):
+        self.version += 1
+        return self.version
+
+    def send(self, payload):
+        pass
+
+
+def test_versions_do_not_depend_on_the_publishers_clock(app, monkeypatch):
+    received = []
+    monkeypatch.setattr(events, '_transport', _Transport())
+    monkeypatch.setitem(events._handlers, 'test-skew', [lambda ids, version: received.append(version)])
+    # A publisher whose clock runs behind the last event it applied
+    clock = iter([2_000_000_000_000_000_000, 1_000_000_000_000_000_000])
+    monkeypatch.setattr(events.time, 'time_ns', lambda: next(clock))
+
+    with app.app_context():
+        events.publish('test-skew', [1])
+        events.publish('test-skew', [1])
+
+    assert received == [1, 2]
@@ -0,0 +1,19 @@
+from extensions import db
+from models import ProductPage
+
+
+def test_in_stock_count_matches_the_listing(app, make_product):
+    from utils import facets
+    from utils.inventory import record_movement
+    sold_out = make_product(stock=100, name='Facet saffron')
+    make_product(stock=100, name='Facet saffron threads')
+    with app.app_context():
+        # Sold out in the ledger; the products.stock_quantity snapshot still says 100
+        record_movement(sold_out, -100, 'sale')
+        db.session.commit()
+        facets.clear_cache()
+
+        counts = facets.compute_facets(search='facet saffron')
+        listed = ProductPage.get_all(search='facet saffron', in_stock=True)
+
+        assert counts['in_stock'] == len(listed) == 1
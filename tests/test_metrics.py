@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from utils import metrics
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _snapshot(directory, pid, requests):
+    with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+        json.dump({'pid': pid, 'counters': [['http_requests_total', [], requests]], 'gauges': [], 'histograms': []}, f)
+
+
+def test_exited_worker_totals_are_archived(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.registry, 'directory', str(tmp_path))
+    pid = _dead_pid()
+    _snapshot(tmp_path, pid, 5)
+    metrics.mark_process_dead(pid, str(tmp_path))
+    # A second notice for the same worker must not count it twice
+    metrics.mark_process_dead(pid, str(tmp_path))
+
+    counters, _, _ = metrics.collect()
+    assert counters[('http_requests_total', ())] == 5
+    assert set(os.listdir(tmp_path)) == {'metrics-archive.json', f'metrics-{os.getpid()}.json'}
+
+
+def test_stale_and_reset_snapshots_are_not_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.registry, 'directory', str(tmp_path))
+    # Left behind by a process that exited without the master folding it in
+    _snapshot(tmp_path, _dead_pid(), 7)
+    assert ('http_requests_total', ()) not in metrics.collect()[0]
+
+    metrics.reset_directory(str(tmp_path))
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('metrics-')]
+
+
+def test_failed_statement_leaves_no_timer_behind(app):
+    from flask import g
+    from sqlalchemy.exc import OperationalError
+    from extensions import db
+    with app.test_request_context():
+        g.db_time, g.db_queries = 0.0, 0
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM no_such_table')
+            conn.exec_driver_sql('SELECT 1')
+            assert not conn.info.get('query_start')
+        assert g.db_queries == 1
+        assert 0 <= g.db_time < 1
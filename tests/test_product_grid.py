@@ -0,0 +1,22 @@
+from extensions import db
+
+
+def test_stock_sort_follows_the_compacted_level(app, make_product):
+    from utils import product_grid
+    from utils.inventory import compact, record_movement
+    first = make_product(stock=100, name='Grid clove')
+    second = make_product(stock=300, name='Grid clove')
+    with app.app_context():
+        # The snapshot ranks the first product lower; once compacted the ledger puts it above
+        record_movement(second, -250, 'sale')
+        db.session.commit()
+        compact()
+        # Shown stock is live even before the next compaction
+        record_movement(second, -10, 'sale')
+        db.session.commit()
+
+        page = product_grid.query_page(search='Grid clove', sort='stock', limit=1)
+        rest = product_grid.query_page(search='Grid clove', sort='stock', cursor=page['next_cursor'])
+
+    rows = page['rows'] + rest['rows']
+    assert [(row['id'], row['stock']) for row in rows] == [(second, 40), (first, 100)]
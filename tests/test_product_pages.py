@@ -0,0 +1,73 @@
+from extensions import db
+from models import ProductPage
+
+
+def test_sales_only_write_the_page_when_it_sells_out(app, make_product):
+    from sqlalchemy import event
+    from utils.inventory import compact, get_stock_level, record_movement
+    product_id = make_product(stock=500)
+    page_writes = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith('UPDATE product_pages'):
+            page_writes.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            record_movement(product_id, -200, 'sale')
+            db.session.commit()
+            assert page_writes == []
+
+            record_movement(product_id, -300, 'sale')
+            db.session.commit()
+            assert len(page_writes) == 1
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        page = ProductPage.get_by_id(product_id)
+        assert (page.stock_quantity, page.in_stock) == (500, False)
+
+        # Compaction brings the page's stock figure up to the ledger
+        compact()
+        db.session.refresh(page)
+        assert page.stock_quantity == get_stock_level(product_id) == 0
+
+
+def test_admin_edit_keeps_page_on_the_ledger_level(app, make_product):
+    from models import Product
+    from utils.inventory import record_movement
+    product_id = make_product(stock=500)
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        record_movement(product_id, -100, 'sale')
+        db.session.commit()
+        # The editor saw 500; the sale made meanwhile is kept
+        product.update(product.name, product.description, product.price, product.category_id,
+                       stock_quantity=600, sku=product.sku, stock_baseline=500)
+        assert ProductPage.get_by_id(product_id).stock_quantity == 500
+
+
+def test_editing_a_product_writes_only_its_own_page(app, make_product):
+    from sqlalchemy import event
+    from models import Product
+    first = make_product(category_id=3)
+    second = make_product(category_id=3)
+    page_writes = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith(('UPDATE product_pages', 'INSERT INTO product_pages')):
+            page_writes.append(statement)
+
+    with app.app_context():
+        product = db.session.get(Product, first)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            product.update('Renamed spice', product.description, product.price, product.category_id,
+                           stock_quantity=1000, sku=product.sku, stock_baseline=1000)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        assert len(page_writes) == 1
+
+        related = [page.product_id for page in ProductPage.get_by_id(second).get_related()]
+        assert first in related and second not in related
+        assert len(related) <= ProductPage.RELATED_LIMIT
@@ -0,0 +1,34 @@
+import cProfile
+import os
+from flask import Flask, g
+from utils import profiler
+
+
+def _app(directory):
+    app = Flask(__name__)
+    app.config.update(PROFILE_DIR=str(directory), PROFILE_SAMPLE_RATE=1, PROFILER_MODE='sample')
+    app.add_url_rule('/page', 'page', lambda: type(g.request_profiler).__name__)
+    return app
+
+
+def test_shared_profile_dir_disables_profiling(tmp_path):
+    directory = tmp_path / 'profiles'
+    directory.mkdir()
+    directory.chmod(0o777)
+    request_profiler = profiler.RequestProfiler(_app(directory))
+    assert request_profiler.directory is None
+    assert request_profiler.list_profiles() == []
+
+
+def test_profile_dir_is_private(tmp_path):
+    directory = tmp_path / 'profiles'
+    directory.mkdir(mode=0o755)
+    profiler.RequestProfiler(_app(directory))
+    assert not os.stat(directory).st_mode & 0o077
+
+
+def test_gevent_falls_back_to_cprofile(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'gevent_active', lambda: True)
+    app = _app(tmp_path / 'profiles')
+    profiler.RequestProfiler(app)
+    assert app.test_client().get('/page').get_data(as_text=True) == cProfile.Profile.__name__
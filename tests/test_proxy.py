@@ -0,0 +1,18 @@
+from werkzeug.test import EnvironBuilder
+
+
+def test_client_address_comes_from_the_proxy(app, monkeypatch):
+    proxy = app.wsgi_app
+    seen = []
+
+    def inner(environ, start_response):
+        seen.append(environ['REMOTE_ADDR'])
+        start_response('204 No Content', [])
+        return []
+
+    monkeypatch.setattr(proxy, 'app', inner)
+    environ = EnvironBuilder(path='/', headers={'X-Forwarded-For': '203.0.113.7'},
+                             environ_base={'REMOTE_ADDR': '10.0.0.1'}).get_environ()
+    proxy(environ, lambda status, headers: None)
+    # Rate limits and login buckets see the client, not the proxy
+    assert seen == ['203.0.113.7']
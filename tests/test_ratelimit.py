@@ -0,0 +1,58 @@
+import os
+import time
+from flask import Flask
+from utils import ratelimit
+
+
+def test_occupancy_is_counted_in_process(tmp_path):
+    store = ratelimit.LocalStore(str(tmp_path / 'limits.db'))
+    store.register(capacity=2)
+    changes = store._conn().total_changes
+
+    assert store.enter(capacity=2) == 0.0
+    assert store.enter(capacity=2) == 0.5
+    store.leave(capacity=2)
+    assert store.enter(capacity=2) == 0.5
+    # Within the publish interval requests never write to the shared file
+    assert store._conn().total_changes == changes
+
+
+def test_other_workers_load_is_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'PUBLISH_INTERVAL', 0.0)
+    store = ratelimit.LocalStore(str(tmp_path / 'limits.db'))
+    conn = store._conn()
+    # A live process that is not us, busy; and one whose count has gone stale
+    conn.execute('INSERT INTO worker_load VALUES (?, 1, 1, ?)', (os.getppid(), time.time()))
+    assert store.enter() == 0.5
+    store.leave()
+    conn.execute('UPDATE worker_load SET updated = ? WHERE pid = ?',
+                 (time.time() - ratelimit.BUSY_TTL - 1, os.getppid()))
+    assert store.enter() == 0.0
+
+
+def test_static_files_are_never_shed(tmp_path, monkeypatch):
+    monkeypatch.setenv('RATE_LIMITING', '1')
+    monkeypatch.setenv('RATE_LIMIT_DB', str(tmp_path / 'limits.db'))
+    monkeypatch.setattr(ratelimit, '_store', None)
+    (tmp_path / 'site.css').write_text('body {}')
+    app = Flask(__name__, static_folder=str(tmp_path), static_url_path='/static')
+    app.add_url_rule('/page', 'page', lambda: 'page')
+    ratelimit.init_app(app)
+
+    client = app.test_client()
+    # Queued far past every shedding threshold
+    headers = {'X-Request-Start': f't={time.time() - 60:.3f}'}
+    assert client.get('/page', headers=headers).status_code == 503
+    assert client.get('/static/site.css', headers=headers).status_code == 200
+
+
+def test_shared_store_directory_disables_limiting(tmp_path, monkeypatch):
+    monkeypatch.delenv('RATE_LIMIT_DB', raising=False)
+    monkeypatch.setattr(ratelimit.tempfile, 'gettempdir', lambda: str(tmp_path))
+    app = Flask(__name__)
+    assert ratelimit.store_path(app).startswith(str(tmp_path))
+    directory = os.path.dirname(ratelimit.store_path(app))
+    assert not os.stat(directory).st_mode & 0o077
+
+    os.chmod(directory, 0o777)
+    assert ratelimit.store_path(app) is None
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in its own process: the app reads DATABASE_REPLICA_URL only at import
+HARNESS = '''
+import json, os, shutil, time
+import sqlalchemy as sa
+from app import app
+from extensions import db
+app.config.update(WTF_CSRF_ENABLED=False)
+# The replica starts as a copy of the seeded primary, then diverges so reads show where they went
+shutil.copy(os.environ['PRIMARY_PATH'], os.environ['REPLICA_PATH'])
+with app.app_context(), db.engines['replica'].begin() as conn:
+    conn.execute(sa.text("UPDATE product_pages SET name = 'FROM REPLICA' WHERE product_id = 1"))
+
+client = app.test_client()
+result = {'anonymous_read': 'FROM REPLICA' in client.get('/products/1').get_data(as_text=True)}
+response = client.post('/products/add-to-cart', data={'product_id': 2, 'quantity': 1})
+result['write_cookie'] = 'db_write_at=' in response.headers.get('Set-Cookie', '')
+result['read_after_write'] = 'FROM REPLICA' in client.get('/products/1').get_data(as_text=True)
+client.delete_cookie('db_write_at')
+result['read_after_cookie_expired'] = 'FROM REPLICA' in client.get('/products/1').get_data(as_text=True)
+print(json.dumps(result))
+'''
+
+
+def test_reads_follow_the_write_cookie(tmp_path):
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{primary}', DATABASE_REPLICA_URL=f'sqlite:///{replica}',
+               PRIMARY_PATH=str(primary), REPLICA_PATH=str(replica), METRICS_DIR=str(tmp_path / 'metrics'),
+               RATE_LIMITING='0', TEMPLATE_CACHE_DIR='off', LOG_LEVEL='WARNING')
+    out = subprocess.run([sys.executable, '-c', HARNESS], env=env, cwd=ROOT, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == {
+        'anonymous_read': True,
+        'write_cookie': True,
+        'read_after_write': False,
+        'read_after_cookie_expired': True,
+    }
@@ -0,0 +1,41 @@
+import re
+import pytest
+from sqlalchemy import event
+from extensions import db
+from models import CartItem
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements executed while the test runs"""
+    with app.app_context():
+        engine = db.engine
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    yield seen
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def _reads(statements, table):
+    return [s for s in statements if s.lstrip().upper().startswith('SELECT') and re.search(rf'\bFROM {table}\b', s)]
+
+
+@pytest.mark.parametrize('path', ['/', '/products/', '/products/cart', '/checkout'])
+def test_page_loads_shared_data_once(app, customer, login, make_product, statements, path):
+    email, password, user_id, _ = customer
+    product_id = make_product()
+    with app.app_context():
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=200))
+        db.session.commit()
+    client = login(email, password)
+    statements.clear()
+
+    assert client.get(path).status_code == 200
+
+    # Navigation categories, the cart badge/summary and the logged-in user are each read once
+    assert len(_reads(statements, 'categories')) == 1
+    assert len(_reads(statements, 'cart_items')) == 1
+    assert len(_reads(statements, 'users')) == 1
@@ -0,0 +1,26 @@
+import os
+from types import SimpleNamespace
+from utils import warmup
+
+
+def test_cache_dir_created_private(tmp_path, monkeypatch):
+    directory = tmp_path / 'jinja'
+    monkeypatch.setenv('TEMPLATE_CACHE_DIR', str(directory))
+    assert warmup.bytecode_cache_dir(SimpleNamespace(root_path='/app')) == str(directory)
+    assert not os.stat(directory).st_mode & 0o077
+
+
+def test_shared_cache_dir_disables_cache(tmp_path, monkeypatch):
+    directory = tmp_path / 'jinja'
+    directory.mkdir()
+    directory.chmod(0o777)
+    monkeypatch.setenv('TEMPLATE_CACHE_DIR', str(directory))
+    assert warmup.bytecode_cache_dir(SimpleNamespace(root_path='/app')) is None
+
+
+def test_symlinked_cache_dir_disables_cache(tmp_path, monkeypatch):
+    target = tmp_path / 'elsewhere'
+    target.mkdir(mode=0o700)
+    (tmp_path / 'jinja').symlink_to(target)
+    monkeypatch.setenv('TEMPLATE_CACHE_DIR', str(tmp_path / 'jinja'))
+    assert warmup.bytecode_cache_dir(SimpleNamespace(root_path='/app')) is None
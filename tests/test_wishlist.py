@@ -0,0 +1,18 @@
+from extensions import db
+from models import WishlistItem
+
+
+def test_wishlist_badge_uses_ledger_stock(app, customer, login, make_product):
+    from utils.inventory import record_movement
+    email, password, user_id, _ = customer
+    product_id = make_product(stock=100)
+    with app.app_context():
+        db.session.add(WishlistItem(user_id=user_id, product_id=product_id))
+        # Sold out, but not yet compacted into the snapshot
+        record_movement(product_id, -100, 'sale')
+        db.session.commit()
+
+    body = login(email, password).get('/products/wishlist').get_data(as_text=True)
+
+    assert 'Out of Stock' in body
+    assert 'In Stock' not in body
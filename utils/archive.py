@@ -0,0 +1,96 @@
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, CheckoutRequest
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Orders in one of these statuses and older than ORDER_ARCHIVE_AFTER_DAYS are moved to the archive
+ARCHIVE_STATUSES = tuple(
+    s.strip() for s in os.environ.get('ORDER_ARCHIVE_STATUSES', 'completed,delivered,cancelled').split(',') if s.strip()
+)
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 365))
+
+ORDER_COLUMNS = ('id', 'user_id', 'total_amount', 'status', 'payment_status',
+                 'shipping_address_id', 'billing_address_id', 'created_at')
+ITEM_COLUMNS = ('id', 'order_id', 'product_id', 'quantity', 'price')
+
+
+def _next_batch(cutoff, after_id, batch_size):
+    query = db.session.query(Order.id).filter(
+        Order.id > after_id,
+        Order.created_at < cutoff,
+        Order.status.in_(ARCHIVE_STATUSES)
+    ).order_by(Order.id).limit(batch_size)
+    if db.engine.dialect.name == 'postgresql':
+        # A second archiver skips rows this one is moving instead of copying them twice
+        query = query.with_for_update(skip_locked=True)
+    return [order_id for order_id, in query.all()]
+
+
+def archive_batch(order_ids):
+    """Move these orders and their items to the archive tables in one transaction"""
+    orders = Order.__table__
+    items = OrderItem.__table__
+    db.session.execute(db.insert(ArchivedOrder).from_select(
+        ORDER_COLUMNS + ('archived_at',),
+        db.select(*(orders.c[name] for name in ORDER_COLUMNS), db.literal(datetime.utcnow(), db.DateTime))
+        .where(orders.c.id.in_(order_ids))
+    ))
+    db.session.execute(db.insert(ArchivedOrderItem).from_select(
+        ITEM_COLUMNS,
+        db.select(*(items.c[name] for name in ITEM_COLUMNS)).where(items.c.order_id.in_(order_ids))
+    ))
+    # Replay protection only matters for minutes; old idempotency keys can go with the order
+    db.session.execute(db.delete(CheckoutRequest).where(CheckoutRequest.order_id.in_(order_ids)))
+    db.session.execute(db.delete(items).where(items.c.order_id.in_(order_ids)))
+    db.session.execute(db.delete(orders).where(orders.c.id.in_(order_ids)))
+    db.session.commit()
+
+
+def archive_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=500, pause=0.5, max_batches=None):
+    """Archive eligible orders oldest first; returns the number moved.
+
+    Every batch commits on its own, so an interrupted run loses nothing and
+    the next run simply continues with whatever is still eligible. The pause
+    between batches keeps row locks and I/O short enough to run beside live
+    traffic.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    batches = 0
+    after_id = 0
+    while max_batches is None or batches < max_batches:
+        order_ids = _next_batch(cutoff, after_id, batch_size)
+        if not order_ids:
+            db.session.rollback()
+            break
+        started = time.perf_counter()
+        archive_batch(order_ids)
+        moved += len(order_ids)
+        batches += 1
+        after_id = order_ids[-1]
+        logger.info('archived order batch', extra={
+            'orders': len(order_ids), 'last_order_id': after_id,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
+        if len(order_ids) < batch_size:
+            break
+        time.sleep(pause)
+    return moved
+
+
+@click.command('orders-archive')
+@click.option('--older-than-days', default=ARCHIVE_AFTER_DAYS, show_default=True)
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--pause', default=0.5, show_default=True, help='Seconds to sleep between batches.')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches.')
+@with_appcontext
+def archive_command(older_than_days, batch_size, pause, max_batches):
+    """Move old completed orders to the archive tables. Safe to interrupt and re-run."""
+    moved = archive_orders(older_than_days, batch_size, pause, max_batches)
+    click.echo(f'Archived {moved} orders')
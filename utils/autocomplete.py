@@ -0,0 +1,376 @@
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from flask import current_app
+from models import Category, ProductPage
+from extensions import db
+from utils import events
+
+logger = logging.getLogger(__name__)
+
+# Edits and popularity (refreshed by inventory compaction) arrive as product events and
+# are applied in place; the rare full rebuild only repairs events a worker missed. 0 disables it
+REFRESH_SECONDS = int(os.environ.get('AUTOCOMPLETE_REBUILD_SECONDS', 6 * 3600))
+# Rows loaded between yields to other threads or greenlets during a build
+BUILD_BATCH = 5000
+MAX_RESULTS = 10
+# Lookups that merge more token lists or scan more products than this are memoized
+MEMO_COST = 200
+# Incremental updates touching more products than this schedule a rebuild instead
+MAX_INCREMENTAL = 500
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+# SKUs only match single-word queries at least this long, and only this many are ranked
+SKU_MIN_PREFIX = 3
+SKU_SCAN_LIMIT = 1000
+
+
+def _tokens(name, category):
+    tokens = set(_TOKEN_RE.findall(name.lower()))
+    tokens.update(_TOKEN_RE.findall((category or '').lower()))
+    return tokens
+
+
+class PrefixIndex:
+    """Sorted token vocabulary with a postings array per token.
+
+    Each product occupies a slot; slots are assigned in id order so the slot
+    of a product is found by bisecting ``ids``. Postings hold slots ordered by
+    popularity, so the best matches for a prefix come from merging the heads
+    of its tokens' postings instead of ranking every match. SKUs are kept in
+    a separate sorted array because each one is unique and a postings array
+    per SKU would dominate memory.
+    """
+
+    def __init__(self):
+        self.ids = array('l')
+        self.names = []
+        self.skus = []
+        self.category_ids = array('l')
+        self.scores = array('l')
+        self.tokens = []
+        self.postings = []
+        self.sku_keys = []
+        self.sku_slots = array('I')
+        self.categories = {}
+        self.built_at = 0
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, rows, categories):
+        """Build from (id, name, sku, category_id, score) rows in id order"""
+        index = cls()
+        index.categories = dict(categories)
+        by_token = {}
+        for slot, (product_id, name, sku, category_id, score) in enumerate(rows):
+            index.ids.append(product_id)
+            index.names.append(name)
+            index.skus.append(sku)
+            index.category_ids.append(category_id)
+            index.scores.append(score or 0)
+            for token in _tokens(name, index.categories.get(category_id)):
+                by_token.setdefault(token, []).append(slot)
+        rank = index._rank
+        index.tokens = sorted(by_token)
+        index.postings = [array('I', sorted(by_token.pop(token), key=rank)) for token in index.tokens]
+        order = sorted(range(len(index.skus)), key=lambda slot: index.skus[slot].lower())
+        index.sku_keys = [index.skus[slot].lower() for slot in order]
+        index.sku_slots = array('I', order)
+        index.built_at = time.monotonic()
+        return index
+
+    def _rank(self, slot):
+        # Most popular first; older products win ties
+        return -self.scores[slot], slot
+
+    def _slot(self, product_id):
+        pos = bisect_left(self.ids, product_id)
+        if pos < len(self.ids) and self.ids[pos] == product_id:
+            return pos
+        return None
+
+    def _unlink(self, slot):
+        for token in _tokens(self.names[slot], self.categories.get(self.category_ids[slot])):
+            pos = bisect_left(self.tokens, token)
+            if pos < len(self.tokens) and self.tokens[pos] == token:
+                postings = self.postings[pos]
+                # Postings are in rank order, so the slot is found by bisecting rather than scanning
+                at = bisect_left(postings, self._rank(slot), key=self._rank)
+                if at < len(postings) and postings[at] == slot:
+                    del postings[at]
+                if not postings:
+                    del self.tokens[pos]
+                    del self.postings[pos]
+        key = self.skus[slot].lower()
+        pos = bisect_left(self.sku_keys, key)
+        while pos < len(self.sku_keys) and self.sku_keys[pos] == key:
+            if self.sku_slots[pos] == slot:
+                del self.sku_keys[pos]
+                del self.sku_slots[pos]
+                break
+            pos += 1
+
+    def _link(self, slot):
+        for token in _tokens(self.names[slot], self.categories.get(self.category_ids[slot])):
+            pos = bisect_left(self.tokens, token)
+            if pos < len(self.tokens) and self.tokens[pos] == token:
+                insort(self.postings[pos], slot, key=self._rank)
+            else:
+                self.tokens.insert(pos, token)
+                self.postings.insert(pos, array('I', [slot]))
+        key = self.skus[slot].lower()
+        pos = bisect_right(self.sku_keys, key)
+        self.sku_keys.insert(pos, key)
+        self.sku_slots.insert(pos, slot)
+
+    def upsert(self, product_id, name, sku, category_id, score=0):
+        """Add or re-index one product. Returns False if it cannot be placed incrementally"""
+        with self._lock:
+            slot = self._slot(product_id)
+            if slot is None:
+                if self.ids and product_id < self.ids[-1]:
+                    # Slots must stay in id order; only new (highest) ids can be appended
+                    return False
+                slot = len(self.ids)
+                self.ids.append(product_id)
+                self.names.append(None)
+                self.skus.append(None)
+                self.category_ids.append(category_id)
+                self.scores.append(score)
+            elif self.names[slot] is not None:
+                self._unlink(slot)
+            # Unlinked first: postings are found by rank, which the score is part of
+            self.scores[slot] = score
+            self.names[slot] = name
+            self.skus[slot] = sku
+            self.category_ids[slot] = category_id
+            self._link(slot)
+            self._memo.clear()
+            return True
+
+    def remove(self, product_id):
+        with self._lock:
+            slot = self._slot(product_id)
+            if slot is None or self.names[slot] is None:
+                return
+            self._unlink(slot)
+            # The slot stays allocated so later slots keep their positions
+            self.names[slot] = None
+            self.skus[slot] = None
+            self._memo.clear()
+
+    def _token_range(self, prefix):
+        lo = bisect_left(self.tokens, prefix)
+        return lo, bisect_right(self.tokens, prefix + '\uffff', lo)
+
+    def _matches(self, slot, patterns):
+        text = f'{self.names[slot]} {self.categories.get(self.category_ids[slot]) or ""}'.lower()
+        return all(pattern.search(text) for pattern in patterns)
+
+    def _sku_matches(self, prefix):
+        lo = bisect_left(self.sku_keys, prefix)
+        hi = bisect_right(self.sku_keys, prefix + '\uffff', lo)
+        return self.sku_slots[lo:min(hi, lo + SKU_SCAN_LIMIT)]
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Most popular products whose tokens start with every word of query"""
+        words = _TOKEN_RE.findall(query.lower())
+        if not words:
+            return []
+        key = (' '.join(words), limit)
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+
+            # Walk the narrowest word's postings in rank order and check the rest per product
+            ranges = sorted(
+                (self._token_range(word) + (word,) for word in words),
+                key=lambda r: sum(len(p) for p in self.postings[r[0]:r[1]])
+            )
+            lo, hi, driver = ranges[0]
+            # A word matches when it starts a token, i.e. is not preceded by a token character
+            others = [re.compile(r'(?<![a-z0-9])' + word) for word in words if word != driver]
+            found = []
+            seen = set()
+            for slot in heapq.merge(*self.postings[lo:hi], key=self._rank):
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                if not others or self._matches(slot, others):
+                    found.append(slot)
+                    if len(found) == limit:
+                        break
+            if len(words) == 1 and len(found) < limit and len(driver) >= SKU_MIN_PREFIX:
+                extra = [slot for slot in self._sku_matches(driver) if slot not in seen]
+                found.extend(heapq.nsmallest(limit - len(found), extra, key=self._rank))
+
+            results = [{
+                'id': self.ids[slot],
+                'name': self.names[slot],
+                'sku': self.skus[slot],
+                'category': self.categories.get(self.category_ids[slot]),
+            } for slot in found]
+            if max(hi - lo, len(seen)) > MEMO_COST:
+                self._memo[key] = results
+            return results
+
+
+_index = None
+_index_lock = threading.Lock()
+_build_lock = threading.Lock()
+_refresher = None
+# Ids changed while a rebuild is loading rows; replayed onto the new index
+_changed_during_build = None
+
+
+def build_index():
+    """Load every active product and swap in a fresh index"""
+    global _index, _changed_during_build
+    with _build_lock:
+        _changed_during_build = set()
+        try:
+            index = _load_index()
+        finally:
+            changed, _changed_during_build = _changed_during_build, None
+        _index = index
+    if changed:
+        products_changed(list(changed))
+    return index
+
+
+def _yielding(rows):
+    # Give other threads (or greenlets, under gevent) a turn between batches of a long build
+    for count, row in enumerate(rows, 1):
+        yield row
+        if count % BUILD_BATCH == 0:
+            time.sleep(0)
+
+
+def _load_index():
+    started = time.perf_counter()
+    categories = db.session.query(Category.id, Category.name).all()
+    rows = db.session.query(
+        ProductPage.product_id, ProductPage.name, ProductPage.sku, ProductPage.category_id, ProductPage.units_sold
+    ).filter(ProductPage.status == 'active').order_by(ProductPage.product_id).yield_per(BUILD_BATCH)
+    index = PrefixIndex.build(_yielding(tuple(row) for row in rows), categories)
+    logger.info('autocomplete index built', extra={
+        'products': len(index.ids), 'tokens': len(index.tokens),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+    return index
+
+
+def _refresh_loop(app):
+    first = True
+    while first or REFRESH_SECONDS > 0:
+        if not first:
+            time.sleep(REFRESH_SECONDS)
+        first = False
+        try:
+            with app.app_context():
+                build_index()
+        except Exception:
+            logger.exception('autocomplete index build failed')
+
+
+def warm(app):
+    """Start building the index in the background; safe to call more than once.
+
+    Returns at once, so a large catalog never holds up worker start-up past
+    gunicorn's timeout; searches fall back to the database until it is ready.
+    """
+    global _refresher
+    with _index_lock:
+        if _refresher is not None:
+            return
+        _refresher = threading.Thread(target=_refresh_loop, args=(app,), name='autocomplete-index', daemon=True)
+        _refresher.start()
+
+
+def get_index():
+    """The built index, or None while the first build is still running"""
+    if _index is None:
+        warm(current_app._get_current_object())
+    return _index
+
+
+def _search_pages(query, limit):
+    # Slower and cruder than the index (names only, substring matches), but only used at start-up
+    words = _TOKEN_RE.findall(query.lower())
+    if not words:
+        return []
+    pages = ProductPage.query.filter(ProductPage.status == 'active')
+    for word in words:
+        pages = pages.filter(ProductPage.name.ilike(f'%{word}%'))
+    pages = pages.order_by(ProductPage.units_sold.desc(), ProductPage.product_id).limit(limit)
+    return [{'id': page.product_id, 'name': page.name, 'sku': page.sku, 'category': page.category_name}
+            for page in pages]
+
+
+def search(query, limit=MAX_RESULTS):
+    index = get_index()
+    if index is None:
+        return _search_pages(query, limit)
+    return index.search(query, limit)
+
+
+def _rebuild_in_background(app):
+    if _build_lock.locked():
+        return
+
+    def run():
+        with app.app_context():
+            build_index()
+    threading.Thread(target=run, name='autocomplete-rebuild', daemon=True).start()
+
+
+@events.on('category')
+def _categories_changed(ids, version):
+    # Category names are indexed into every product's tokens
+    if _index is not None:
+        _rebuild_in_background(current_app._get_current_object())
+
+
+@events.on('product')
+def _products_invalidated(ids, version):
+    if ids is None:
+        if _index is not None:
+            _rebuild_in_background(current_app._get_current_object())
+        return
+    products_changed(ids)
+
+
+def products_changed(product_ids):
+    """Re-index the given products from the database after they were written"""
+    index = _index
+    if not product_ids:
+        return
+    if _changed_during_build is not None:
+        _changed_during_build.update(product_ids)
+    if index is None:
+        return
+    if len(product_ids) > MAX_INCREMENTAL:
+        # Too many to patch in place without stalling this request
+        _rebuild_in_background(current_app._get_current_object())
+        return
+    # Pages carry popularity, so the same path applies edits and compacted sales
+    rows = db.session.query(
+        ProductPage.product_id, ProductPage.name, ProductPage.sku, ProductPage.category_id,
+        ProductPage.status, ProductPage.units_sold
+    ).filter(ProductPage.product_id.in_(product_ids)).all()
+    found = set()
+    for row in rows:
+        found.add(row.product_id)
+        if row.status != 'active':
+            index.remove(row.product_id)
+        elif not index.upsert(row.product_id, row.name, row.sku, row.category_id, row.units_sold):
+            _rebuild_in_background(current_app._get_current_object())
+            return
+    for product_id in set(product_ids) - found:
+        index.remove(product_id)
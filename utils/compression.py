@@ -0,0 +1,221 @@
+import hashlib
+import zlib
+from functools import wraps
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'application/xml', 'image/svg+xml',
+)
+SKIP_KEY = 'compression.skip'
+
+
+def skip_compression(f):
+    """Leave this view's response alone: no compression, ETag or 304 from the middleware"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        request.environ[SKIP_KEY] = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _accepts(environ, coding):
+    for part in environ.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() == coding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers, *names):
+    names = {n.lower() for n in names}
+    return [(k, v) for k, v in headers if k.lower() not in names]
+
+
+def _with_vary(headers):
+    vary = _header(headers, 'Vary')
+    if vary is None:
+        return headers + [('Vary', 'Accept-Encoding')]
+    if 'accept-encoding' in vary.lower():
+        return headers
+    return _without(headers, 'Vary') + [('Vary', f'{vary}, Accept-Encoding')]
+
+
+def _etag_matches(environ, etag):
+    header = environ.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison: the W/ prefix is ignored on both sides
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress responses and answer conditional GETs for the wrapped WSGI app.
+
+    Responses up to ``buffer_limit`` bytes with a known length are buffered,
+    given a weak ETag (unless the app set one) and answered with 304 when the
+    client already has them. Larger or unsized responses are compressed as
+    they stream, without an ETag. Views opt out with ``skip_compression``.
+    """
+
+    def __init__(self, app, min_size=512, buffer_limit=1024 * 1024, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.min_size = min_size
+        self.buffer_limit = buffer_limit
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoding(self, environ):
+        if brotli is not None and _accepts(environ, 'br'):
+            return 'br'
+        if _accepts(environ, 'gzip'):
+            return 'gzip'
+        return None
+
+    def _stream(self, encoding):
+        if encoding == 'br':
+            return _BrotliStream(self.brotli_quality)
+        return _GzipStream(self.gzip_level)
+
+    def __call__(self, environ, start_response):
+        # HEAD bodies are empty, so neither an ETag nor compression can be derived from them
+        if environ.get('REQUEST_METHOD') != 'GET':
+            return self.app(environ, start_response)
+
+        captured = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            # Nothing has been sent yet, so an error page may simply replace the headers
+            captured['status'] = status
+            captured['headers'] = headers
+            return written.append
+
+        body = self.app(environ, capture)
+        status, headers = captured['status'], captured['headers']
+        content_type = (_header(headers, 'Content-Type') or '').split(';')[0].strip().lower()
+        length = _header(headers, 'Content-Length')
+
+        if (environ.get(SKIP_KEY) or not status.startswith('200')
+                or _header(headers, 'Content-Encoding') or content_type not in COMPRESSIBLE_TYPES):
+            start_response(status, headers)
+            return self._passthrough(written, body)
+
+        encoding = self._encoding(environ)
+        if length is None or int(length) > self.buffer_limit:
+            if encoding is None:
+                start_response(status, headers)
+                return self._passthrough(written, body)
+            headers = _with_vary(_without(headers, 'Content-Length'))
+            headers.append(('Content-Encoding', encoding))
+            etag = _header(headers, 'ETag')
+            if etag and not etag.startswith('W/'):
+                # The bytes differ from the identity representation now
+                headers = _without(headers, 'ETag') + [('ETag', 'W/' + etag)]
+            start_response(status, headers)
+            return self._compress_stream(written, body, self._stream(encoding))
+
+        try:
+            data = b''.join(written) + b''.join(body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+        etag = _header(headers, 'ETag')
+        if etag is None:
+            etag = 'W/"%s"' % hashlib.sha1(data).hexdigest()
+        elif not etag.startswith('W/') and encoding and len(data) >= self.min_size:
+            etag = 'W/' + etag
+        headers = _with_vary(_without(headers, 'ETag', 'Content-Length') + [('ETag', etag)])
+
+        if _etag_matches(environ, etag):
+            start_response('304 Not Modified', _without(headers, 'Content-Type'))
+            return []
+
+        if encoding and len(data) >= self.min_size:
+            stream = self._stream(encoding)
+            data = stream.compress(data) + stream.flush()
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(len(data))))
+        start_response(status, headers)
+        return [data]
+
+    @staticmethod
+    def _passthrough(written, body):
+        if not written:
+            return body
+        return _Chained(written, body)
+
+    @staticmethod
+    def _compress_stream(written, body, stream):
+        try:
+            for chunk in written:
+                yield stream.compress(chunk)
+            for chunk in body:
+                compressed = stream.compress(chunk)
+                if compressed:
+                    yield compressed
+            yield stream.flush()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+
+class _Chained:
+    """Data passed to write() followed by the app's iterable, keeping its close()"""
+
+    def __init__(self, written, body):
+        self._written = written
+        self._body = body
+
+    def __iter__(self):
+        yield from self._written
+        yield from self._body
+
+    def close(self):
+        if hasattr(self._body, 'close'):
+            self._body.close()
@@ -0,0 +1,50 @@
+# Support for running under gunicorn's gevent workers (GUNICORN_WORKER_CLASS=gevent)
+import os
+
+
+def gevent_active():
+    """True when gevent has monkey-patched this process"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def patch_psycopg():
+    """Make psycopg2 wait on the gevent hub instead of blocking the whole worker"""
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+
+    def gevent_wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
+
+    extensions.set_wait_callback(gevent_wait_callback)
+
+
+def configure_threadpool():
+    """Size gevent's native thread pool, used for CPU-bound work such as password hashing"""
+    from gevent import get_hub
+    get_hub().threadpool.maxsize = int(os.environ.get('GEVENT_THREADPOOL_SIZE', 4))
+
+
+def run_cpu_bound(func, *args, **kwargs):
+    """Run func in a real OS thread under gevent so other greenlets keep serving.
+
+    hashlib releases the GIL, so hashing in the pool overlaps with request
+    handling. Outside gevent this is a plain call.
+    """
+    if gevent_active():
+        from gevent import get_hub
+        return get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
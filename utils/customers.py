@@ -0,0 +1,88 @@
+from datetime import datetime
+from decimal import Decimal
+import click
+from flask.cli import with_appcontext
+from models import User, CustomerStats, Order, ArchivedOrder
+from extensions import db
+from utils.db import encode_cursor, decode_cursor, keyset_after, keyset_order
+
+PAGE_SIZE = 25
+
+# sort key -> (label, expression, cursor value parser, descending)
+SORTS = {
+    'joined': ('Newest', User.id, int, True),
+    'name': ('Name', db.func.lower(User.last_name), str, False),
+    'spend': ('Total spent', CustomerStats.total_spent, Decimal, True),
+    'orders': ('Most orders', CustomerStats.order_count, int, True),
+    'last_order': ('Last order', CustomerStats.last_order_at, datetime.fromisoformat, True),
+}
+
+
+def _search_filter(term):
+    term = term.strip().lower()
+    parts = term.split(None, 1)
+    if len(parts) == 2:
+        # "first last" narrows on both names
+        return db.and_(
+            db.func.lower(User.first_name).like(f'{parts[0]}%'),
+            db.func.lower(User.last_name).like(f'{parts[1]}%')
+        )
+    return db.or_(
+        db.func.lower(User.email).like(f'{term}%'),
+        db.func.lower(User.first_name).like(f'{term}%'),
+        db.func.lower(User.last_name).like(f'{term}%')
+    )
+
+
+def query_page(search=None, sort='joined', cursor=None, limit=PAGE_SIZE):
+    """One page of customers with their lifetime stats, in one query.
+
+    Returns (rows, next_cursor). Raises ValueError for an unknown sort or a bad cursor.
+    """
+    if sort not in SORTS:
+        raise ValueError('Unknown sort')
+    _, column, parse, descending = SORTS[sort]
+    # Customers without orders have no stats row, so every stats column is nullable here
+    nullable = column is not User.id and sort != 'name'
+
+    query = db.session.query(
+        User.id, User.first_name, User.last_name, User.email, User.phone, User.created_at,
+        CustomerStats.order_count, CustomerStats.total_spent, CustomerStats.last_order_at,
+        column.label('sort_value')
+    ).outerjoin(CustomerStats, CustomerStats.user_id == User.id).filter(User.role == 'user')
+    if search and search.strip():
+        query = query.filter(_search_filter(search))
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor, parse, int)
+        query = query.filter(keyset_after(column, sort_value, User.id, last_id, descending, nullable))
+
+    rows = query.order_by(*keyset_order(column, User.id, descending, nullable)).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].sort_value, rows[-1].id)
+    return rows, next_cursor
+
+
+def get_summary():
+    """Headline counts for the customer list"""
+    return {
+        'total_customers': User.query.filter_by(role='user').count(),
+        'ordering_customers': CustomerStats.query.filter(CustomerStats.order_count > 0).count(),
+    }
+
+
+def backfill_stats_if_empty():
+    """Build the stats on first start against a database that already has orders"""
+    if db.session.query(CustomerStats.user_id).first() is None and (
+            db.session.query(Order.id).first() is not None
+            or db.session.query(ArchivedOrder.id).first() is not None):
+        CustomerStats.rebuild()
+
+
+@click.command('customers-rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Recompute the per-customer order aggregates from live and archived orders."""
+    count = CustomerStats.rebuild()
+    click.echo(f'Rebuilt stats for {count} customers')
@@ -1,2 +1,129 @@
 # PostgreSQL database utilities
 # Database connection is now handled by Flask-SQLAlchemy in app.py
+import base64
+import json
+import os
+import time
+from datetime import datetime
+from decimal import Decimal
+from functools import wraps
+from flask import g, request
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex
+from extensions import db
+
+# After a client writes, its reads stay on the primary this long to hide replica lag
+REPLICA_STICKY_SECONDS = 5
+WRITE_COOKIE = 'db_write_at'
+
+
+def engine_options_from_env():
+    """SQLAlchemy engine options driven by DB_* environment variables"""
+    options = {
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 300)),
+        "pool_pre_ping": True,
+    }
+    if os.environ.get("DB_PGBOUNCER"):
+        # PgBouncer in transaction mode does the pooling; holding server
+        # connections here as well would pin them to idle workers
+        options["poolclass"] = NullPool
+        options.pop("pool_recycle")
+    else:
+        options["pool_size"] = int(os.environ.get("DB_POOL_SIZE", 5))
+        options["max_overflow"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+        options["pool_timeout"] = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+    return options
+
+
+def read_replica(f):
+    """Route the view's SELECTs to the replica unless this client wrote recently"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if time.time() - request.cookies.get(WRITE_COOKIE, 0, type=float) > REPLICA_STICKY_SECONDS:
+            g.db_route = 'replica'
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _set_write_cookie(response):
+    if g.get('db_wrote'):
+        response.set_cookie(WRITE_COOKIE, f'{time.time():.3f}', max_age=REPLICA_STICKY_SECONDS,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def remember_writes(app):
+    """Send clients that wrote a cookie keeping their next reads on the primary.
+
+    A cookie rather than a session key, so a write never costs a session
+    store update. Runs before the session is saved, so that save doesn't count.
+    """
+    app.after_request(_set_write_cookie)
+
+
+def dialect_insert(table):
+    """INSERT construct for the bound dialect, so ON CONFLICT clauses are available"""
+    if db.engine.dialect.name == 'sqlite':
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def create_missing_indexes():
+    """Create indexes declared on models but missing from existing tables.
+
+    db.create_all() skips tables that already exist, so indexes added to a
+    model later would otherwise never reach deployed databases.
+    """
+    # IF NOT EXISTS rather than checkfirst: SQLite cannot reflect expression indexes
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def encode_cursor(*values):
+    """Opaque URL-safe token for a keyset position"""
+    values = [v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, Decimal) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *parsers):
+    """Inverse of encode_cursor; each value is passed through its parser. Raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(parsers):
+            raise ValueError
+        return tuple(None if v is None else parse(v) for v, parse in zip(values, parsers))
+    except (ArithmeticError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def keyset_order(column, id_column, descending=False, nullable=None):
+    """ORDER BY for (column, id) paging; NULLs in column sort last either way"""
+    tie_break = id_column.desc() if descending else id_column
+    if column is id_column:
+        return [tie_break]
+    order = column.desc() if descending else column.asc()
+    if nullable is None:
+        nullable = getattr(column, 'nullable', True)
+    if nullable:
+        order = order.nulls_last()
+    return [order, tie_break]
+
+
+def keyset_after(column, value, id_column, last_id, descending=False, nullable=None):
+    """Rows strictly after (value, last_id) in keyset_order(column, id_column, descending)"""
+    past_id = id_column < last_id if descending else id_column > last_id
+    if column is id_column:
+        return past_id
+    if value is None:
+        return db.and_(column.is_(None), past_id)
+    past_value = column < value if descending else column > value
+    if nullable is None:
+        nullable = getattr(column, 'nullable', True)
+    if nullable:
+        return db.or_(past_value, db.and_(column == value, past_id), column.is_(None))
+    return db.or_(past_value, db.and_(column == value, past_id))
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from sqlalchemy import Sequence, text
+from extensions import db
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'cache_invalidation'
+# Events naming more ids than this mean "everything of this entity changed"
+MAX_IDS_PER_EVENT = 500
+# Last applied version per (entity, id), to drop duplicate and out-of-order events
+VERSION_MEMORY = 10000
+RECONNECT_DELAY = 2.0
+# Event versions on PostgreSQL: one counter for every host, so clock skew cannot reorder events
+VERSION_SEQUENCE = Sequence('cache_invalidation_version', metadata=db.metadata)
+
+_handlers = defaultdict(list)
+_versions = OrderedDict()
+_versions_lock = threading.Lock()
+_listener_lock = threading.Lock()
+_listener_pid = None
+_origin = None
+_transport = None
+
+
+def on(entity):
+    """Register a handler called as handler(ids, version) when `entity` rows change.
+
+    ids is a list of primary keys, or None when the change was too broad to list.
+    """
+    def decorator(f):
+        _handlers[entity].append(f)
+        return f
+    return decorator
+
+
+def _process_origin():
+    # Recomputed after fork so each worker recognises only its own events
+    global _origin
+    if _origin is None or _origin[1] != os.getpid():
+        _origin = (f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}', os.getpid())
+    return _origin[0]
+
+
+def _fresh_ids(entity, ids, version):
+    """The ids this version has not already been applied for"""
+    fresh = []
+    with _versions_lock:
+        for entity_id in ids:
+            key = (entity, entity_id)
+            if _versions.get(key, 0) >= version:
+                continue
+            _versions[key] = version
+            _versions.move_to_end(key)
+            fresh.append(entity_id)
+        while len(_versions) > VERSION_MEMORY:
+            _versions.popitem(last=False)
+    return fresh
+
+
+def _apply(message, source):
+    entity, ids, version = message['entity'], message['ids'], message['version']
+    # Unversioned (the version could not be issued) events are applied, never ordered
+    if ids is not None and version is not None:
+        ids = _fresh_ids(entity, ids, version)
+        if not ids:
+            return
+    metrics.registry.inc('cache_invalidations_total', (('entity', entity), ('source', source)))
+    for handler in _handlers.get(entity, ()):
+        try:
+            handler(ids, version)
+        except Exception:
+            logger.exception('invalidation handler failed', extra={'entity': entity, 'handler': handler.__name__})
+
+
+def publish(entity, ids=None):
+    """Apply a change event in this process and broadcast it to every other worker.
+
+    Call after the change has been committed, so receivers read the new rows.
+    """
+    if ids is not None:
+        ids = sorted(set(ids))
+        if len(ids) > MAX_IDS_PER_EVENT:
+            ids = None
+    try:
+        transport = get_transport()
+        version = transport.next_version()
+    except Exception:
+        logger.exception('failed to issue invalidation version', extra={'entity': entity})
+        transport = version = None
+    message = {
+        'entity': entity,
+        'ids': ids,
+        'version': version,
+        'origin': _process_origin(),
+        'sent_at': time.time(),
+    }
+    _apply(message, 'local')
+    if transport is None:
+        return
+    try:
+        transport.send(json.dumps(message, separators=(',', ':')))
+    except Exception:
+        # Other workers catch up on their next periodic refresh
+        logger.exception('failed to broadcast invalidation', extra={'entity': entity})
+
+
+class PostgresTransport:
+    """NOTIFY on publish; one LISTEN connection per worker, outside the pool"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def next_version(self):
+        with self.engine.connect() as conn:
+            return conn.execute(db.select(VERSION_SEQUENCE.next_value())).scalar()
+
+    def send(self, payload):
+        with self.engine.connect() as conn:
+            conn.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': CHANNEL, 'payload': payload})
+            conn.commit()
+
+    def listen(self, deliver):
+        raw = self.engine.raw_connection()
+        # Detached so the pool never hands this LISTENing connection to a request
+        raw.detach()
+        conn = raw.driver_connection
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    deliver(conn.notifies.pop(0).payload)
+        finally:
+            raw.close()
+
+
+class SocketTransport:
+    """Unix datagram socket per worker in a shared directory, for databases without NOTIFY.
+
+    Only reaches workers on the same host, which is the deployment SQLite supports anyway.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def next_version(self):
+        # Every receiver is on this host, so they all share the clock that issued it
+        return time.time_ns()
+
+    def _own_path(self):
+        return os.path.join(self.directory, f'{os.getpid()}.sock')
+
+    def send(self, payload):
+        data = payload.encode()
+        own = self._own_path()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if path == own or not name.endswith('.sock'):
+                    continue
+                try:
+                    sock.sendto(data, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The worker that bound it has exited
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except BlockingIOError:
+                    logger.warning('invalidation dropped; receiver queue full', extra={'socket': name})
+
+    def listen(self, deliver):
+        path = self._own_path()
+        if os.path.exists(path):
+            os.unlink(path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(path)
+            try:
+                while True:
+                    deliver(sock.recv(65536).decode())
+            finally:
+                os.unlink(path)
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        if db.engine.dialect.name == 'postgresql':
+            _transport = PostgresTransport(db.engine)
+        else:
+            url = str(db.engine.url)
+            directory = os.environ.get('INVALIDATION_SOCKET_DIR') or os.path.join(
+                tempfile.gettempdir(), 'spice-invalidation-' + hashlib.sha1(url.encode()).hexdigest()[:12]
+            )
+            _transport = SocketTransport(directory)
+    return _transport
+
+
+def _listen_forever(app):
+    def deliver(payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning('malformed invalidation payload')
+            return
+        if message.get('origin') == _process_origin():
+            return
+        metrics.registry.observe('cache_invalidation_lag_seconds', (('entity', message['entity']),),
+                                 max(time.time() - message.get('sent_at', time.time()), 0.0))
+        with app.app_context():
+            _apply(message, 'remote')
+
+    while True:
+        try:
+            with app.app_context():
+                transport = get_transport()
+            transport.listen(deliver)
+        except Exception:
+            logger.exception('invalidation listener failed; reconnecting')
+        time.sleep(RECONNECT_DELAY)
+
+
+def start_listener(app):
+    """Start this process's listener thread once; safe to call on every request"""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen_forever, args=(app,), name='invalidation-listener', daemon=True).start()
+
+
+def init_app(app):
+    """Listen for other workers' change events; started lazily so it runs after gunicorn forks"""
+    app.before_request(lambda: start_listener(app))
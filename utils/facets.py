@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import Counter
+from models import ProductPage
+from extensions import db
+from utils import events
+
+# (key, label, low, high); high is exclusive
+PRICE_BUCKETS = [
+    ('0-10', 'Under ₹10', 0, 10),
+    ('10-25', '₹10 – ₹25', 10, 25),
+    ('25-50', '₹25 – ₹50', 25, 50),
+    ('50-', '₹50 and above', 50, None),
+]
+SORTS = [
+    ('', 'Featured'),
+    ('newest', 'Newest'),
+    ('price_asc', 'Price: Low to High'),
+    ('price_desc', 'Price: High to Low'),
+    ('popular', 'Most Popular'),
+]
+FACET_CACHE_TTL = 60
+FACET_CACHE_SIZE = 512
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def price_range(bucket_key):
+    """(low, high) bounds for a price bucket key, or None if unknown"""
+    for key, _, low, high in PRICE_BUCKETS:
+        if key == bucket_key:
+            return low, high
+    return None
+
+
+def _bucket_expr():
+    whens = [(ProductPage.price < high, key) for key, _, _, high in PRICE_BUCKETS if high is not None]
+    return db.case(*whens, else_=PRICE_BUCKETS[-1][0])
+
+
+def _facet_rows(search):
+    """Active products grouped by every facet dimension, for one search term.
+
+    Read from the same product_pages rows and columns the listing filters
+    on, so counts match what selecting a value returns. The grouped rows only
+    depend on the search term, so every combination of category/price/stock/
+    discount filters for that term is served from one cached result.
+    """
+    key = (search or '').strip().lower()
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    in_stock = db.case((ProductPage.in_stock.is_(True), 1), else_=0)
+    discounted = db.case((ProductPage.discount_percent.isnot(None), 1), else_=0)
+    query = db.session.query(
+        ProductPage.category_id, _bucket_expr(), in_stock, discounted, db.func.count()
+    ).filter(ProductPage.status == 'active')
+    if key:
+        search_term = f"%{search}%"
+        query = query.filter(db.or_(ProductPage.name.ilike(search_term), ProductPage.description.ilike(search_term)))
+    rows = [tuple(row) for row in query.group_by(ProductPage.category_id, _bucket_expr(), in_stock, discounted)]
+
+    with _cache_lock:
+        if len(_cache) >= FACET_CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = (now + FACET_CACHE_TTL, rows)
+    return rows
+
+
+def compute_facets(search=None, category=None, price=None, in_stock=False, discounted=False):
+    """Counts for each facet value under the current filters.
+
+    Each facet's counts apply every filter except its own, so the sidebar
+    shows what selecting that value would return.
+    """
+    categories = Counter()
+    prices = Counter()
+    in_stock_count = discounted_count = total = 0
+
+    for cat, bucket, stocked, disc, count in _facet_rows(search):
+        match_cat = not category or cat == category
+        match_price = not price or bucket == price
+        match_stock = not in_stock or stocked
+        match_disc = not discounted or disc
+        if match_price and match_stock and match_disc:
+            categories[cat] += count
+        if match_cat and match_stock and match_disc:
+            prices[bucket] += count
+        if match_cat and match_price and match_disc and stocked:
+            in_stock_count += count
+        if match_cat and match_price and match_stock and disc:
+            discounted_count += count
+        if match_cat and match_price and match_stock and match_disc:
+            total += count
+
+    return {
+        'categories': categories,
+        'prices': prices,
+        'in_stock': in_stock_count,
+        'discounted': discounted_count,
+        'total': total,
+    }
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+@events.on('product')
+@events.on('category')
+def _invalidate(ids, version):
+    clear_cache()
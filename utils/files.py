@@ -0,0 +1,10 @@
+import os
+import stat
+
+
+def private_dir(directory):
+    """Create `directory` for this user only; False if it exists and someone else could write to it"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # Not a symlink, owned by us and not group/world writable: nobody else can plant or swap files
+    info = os.lstat(directory)
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and not info.st_mode & 0o022
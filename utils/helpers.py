@@ -1,13 +1,32 @@
+import secrets
+from datetime import datetime
 from flask import session
-from models import Product, CartItem
+from models import Product, CartItem, Category
 from extensions import db
 from flask_login import current_user
+from utils.inventory import reserve_stock, release_reservations, get_available_stock
+from utils.request_cache import request_cached, forget
 
+def get_cart_holder():
+    """Key that identifies the current cart for stock reservations"""
+    if current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    if 'cart_holder' not in session:
+        session['cart_holder'] = secrets.token_urlsafe(16)
+    return f"guest:{session['cart_holder']}"
+
+@request_cached('categories')
+def get_categories():
+    """All categories, fetched at most once per request"""
+    return Category.get_all()
+
+@request_cached('cart')
 def get_cart_items():
     """Get cart items with product details"""
     if current_user.is_authenticated:
         cart_items = []
-        for item in CartItem.query.filter_by(user_id=current_user.id).all():
+        query = CartItem.query.filter_by(user_id=current_user.id).options(db.joinedload(CartItem.product))
+        for item in query.all():
             if item.product and item.product.status == 'active':
                 cart_items.append({
                     'product': item.product,
@@ -18,9 +37,16 @@ def get_cart_items():
     else:
         cart = session.get('cart', {})
         cart_items = []
+        product_ids = []
+        for product_id in cart:
+            try:
+                product_ids.append(int(product_id))
+            except (ValueError, TypeError):
+                pass
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids))} if product_ids else {}
         for product_id, quantity in cart.items():
             try:
-                product = Product.query.get(int(product_id))
+                product = products.get(int(product_id))
                 if product and product.status == 'active':
                     cart_items.append({
                         'product': product,
@@ -31,8 +57,18 @@ def get_cart_items():
                 pass
         return cart_items
 
+def get_cart_summary():
+    """Distinct item count, total quantity and total price of the cart"""
+    cart_items = get_cart_items()
+    return {
+        'count': len(cart_items),
+        'quantity': sum(item['quantity'] for item in cart_items),
+        'total': sum(item['subtotal'] for item in cart_items)
+    }
+
 def add_to_cart(product_id, quantity=1):
     """Add product to cart"""
+    forget('cart')
     if current_user.is_authenticated:
         cart_item = CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).first()
         if cart_item:
@@ -41,6 +77,7 @@ def add_to_cart(product_id, quantity=1):
             cart_item = CartItem(user_id=current_user.id, product_id=product_id, quantity=quantity)
             db.session.add(cart_item)
         db.session.commit()
+        total = cart_item.quantity
     else:
         if 'cart' not in session:
             session['cart'] = {}
@@ -49,21 +86,27 @@ def add_to_cart(product_id, quantity=1):
         else:
             session['cart'][product_id] = quantity
         session.modified = True
+        total = session['cart'][product_id]
+    reserve_stock(product_id, total, get_cart_holder())
 
 def update_cart_item(product_id, quantity):
     """Update quantity of item in cart"""
+    forget('cart')
     if current_user.is_authenticated:
         cart_item = CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).first()
         if cart_item:
             cart_item.quantity = quantity
             db.session.commit()
+            reserve_stock(product_id, quantity, get_cart_holder())
     else:
         if 'cart' in session and product_id in session['cart']:
             session['cart'][product_id] = quantity
             session.modified = True
+            reserve_stock(product_id, quantity, get_cart_holder())
 
 def remove_from_cart(product_id):
     """Remove item from cart"""
+    forget('cart')
     if current_user.is_authenticated:
         cart_item = CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).first()
         if cart_item:
@@ -73,15 +116,83 @@ def remove_from_cart(product_id):
         if 'cart' in session and product_id in session['cart']:
             del session['cart'][product_id]
             session.modified = True
+    release_reservations(get_cart_holder(), product_id)
 
 def clear_cart():
     """Clear all items from cart"""
+    forget('cart')
+    release_reservations(get_cart_holder())
     if current_user.is_authenticated:
         CartItem.query.filter_by(user_id=current_user.id).delete()
         db.session.commit()
     else:
         session.pop('cart', None)
 
+def merge_guest_cart(user_id):
+    """Move the guest cart from the session into the user's CartItem rows.
+
+    Quantities for products already in the user's cart are added together;
+    everything else is inserted in a single multi-row INSERT. Merged
+    quantities are capped at the stock available to the user and reserved
+    under the user's holder, as add_to_cart does. Returns the ids of
+    products whose merged quantity had to be reduced.
+    """
+    forget('cart')
+    cart = session.pop('cart', None)
+    holder = session.pop('cart_holder', None)
+    if holder:
+        release_reservations(f'guest:{holder}')
+    if not cart:
+        return []
+
+    quantities = {}
+    for product_id, quantity in cart.items():
+        try:
+            quantities[int(product_id)] = int(quantity)
+        except (ValueError, TypeError):
+            pass
+    valid_ids = {pid for (pid,) in db.session.query(Product.id).filter(
+        Product.id.in_(quantities), Product.status == 'active'
+    )}
+
+    existing = {
+        item.product_id: item
+        for item in CartItem.query.filter(CartItem.user_id == user_id, CartItem.product_id.in_(valid_ids))
+    }
+    holder = f'user:{user_id}'
+    merged, reduced, new_rows = {}, [], []
+    for product_id in sorted(valid_ids):
+        current = existing[product_id].quantity if product_id in existing else 0
+        # Never shrink what the user already had; only the guest's addition is capped
+        quantity = min(current + quantities[product_id], max(current, get_available_stock(product_id, holder)))
+        if quantity < current + quantities[product_id]:
+            reduced.append(product_id)
+        if quantity <= 0:
+            continue
+        merged[product_id] = quantity
+        if product_id in existing:
+            existing[product_id].quantity = quantity
+        else:
+            new_rows.append({
+                'user_id': user_id,
+                'product_id': product_id,
+                'quantity': quantity,
+                'created_at': datetime.utcnow()
+            })
+    if new_rows:
+        db.session.execute(db.insert(CartItem), new_rows)
+    db.session.commit()
+    for product_id, quantity in merged.items():
+        reserve_stock(product_id, quantity, holder)
+    return reduced
+
+def get_cart_quantity(product_id):
+    """Quantity of one product already in the cart"""
+    if current_user.is_authenticated:
+        cart_item = CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).first()
+        return cart_item.quantity if cart_item else 0
+    return session.get('cart', {}).get(product_id, 0)
+
 def get_cart_count():
     """Get number of distinct products in cart"""
     if current_user.is_authenticated:
@@ -0,0 +1,245 @@
+import hashlib
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam
+from models import Product, StockMovement, StockReservation
+from extensions import db
+from utils.db import dialect_insert
+from utils import events, product_pages
+
+logger = logging.getLogger(__name__)
+
+# Cart holds expire after this many seconds without being refreshed
+RESERVATION_TTL = 30 * 60
+# Checkout claims only live while an order is being written; a crashed checkout frees its stock after this
+CHECKOUT_CLAIM_TTL = 60
+CHECKOUT_HOLDER = 'checkout:'
+LOW_STOCK_THRESHOLD = 10
+
+
+def record_movement(product_id, quantity, kind, reference=None):
+    """Append a signed stock delta to the ledger; committed with the caller's transaction"""
+    movement = StockMovement(product_id=product_id, quantity=quantity, kind=kind, reference=reference)
+    db.session.add(movement)
+    # The storefront document only has an in_stock flag to keep current; it is written
+    # when the level crosses zero, so sales of a hot product do not queue on its page row
+    level = get_stock_level(product_id)
+    if (level > 0) != (level - quantity > 0):
+        product_pages.set_in_stock({product_id: level})
+    return movement
+
+
+class InsufficientStock(ValueError):
+    """A sale asked for more than a product has; shortages maps product id to the level left"""
+
+    def __init__(self, shortages):
+        super().__init__('Insufficient stock')
+        self.shortages = shortages
+
+
+def _pending_delta(product_ids=None):
+    query = db.session.query(
+        StockMovement.product_id,
+        db.func.sum(StockMovement.quantity).label('delta')
+    )
+    # Only aggregate the movements of the products asked for
+    if product_ids is not None:
+        query = query.filter(StockMovement.product_id.in_(product_ids))
+    return query.group_by(StockMovement.product_id).subquery()
+
+
+def _level_column(pending):
+    return (Product.stock_quantity + db.func.coalesce(pending.c.delta, 0)).label('level')
+
+
+def get_stock_levels(product_ids):
+    """Current stock (snapshot plus uncompacted movements) for several products in one query"""
+    if not product_ids:
+        return {}
+    pending = _pending_delta(product_ids)
+    rows = db.session.query(Product.id, _level_column(pending)) \
+        .outerjoin(pending, pending.c.product_id == Product.id) \
+        .filter(Product.id.in_(product_ids)).all()
+    return {row.id: row.level for row in rows}
+
+
+def get_stock_level(product_id):
+    return get_stock_levels([product_id]).get(int(product_id), 0)
+
+
+def checkout_holder(user_id=None, idempotency_key=None):
+    """Reservation holder for a checkout claim; resubmissions of one form share theirs"""
+    if idempotency_key:
+        return CHECKOUT_HOLDER + hashlib.sha1(f'{user_id}:{idempotency_key}'.encode()).hexdigest()
+    return CHECKOUT_HOLDER + uuid.uuid4().hex
+
+
+def claim_stock(quantities, holder, ttl=CHECKOUT_CLAIM_TTL):
+    """Hold every {product_id: quantity} for a checkout under `holder`.
+
+    No product row is locked. The claim is committed first and checked after,
+    so of two checkouts racing for the last units the later check always sees
+    both claims: one (or at worst both) is refused, never both accepted.
+    Raises InsufficientStock, with the claim already released, if anything is
+    short. Settle the claim in the transaction that records the sale.
+    """
+    product_ids = sorted(quantities)
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+    stmt = dialect_insert(StockReservation.__table__).values([
+        {'product_id': pid, 'holder': holder, 'quantity': quantities[pid], 'expires_at': expires_at}
+        for pid in product_ids
+    ])
+    # A resubmitted form finds its own claim already there rather than claiming the stock twice
+    db.session.execute(stmt.on_conflict_do_nothing(index_elements=['product_id', 'holder']))
+    db.session.commit()
+
+    # Level and claims come from one statement, so an order committing meanwhile
+    # (its movements in, its claim out) is counted exactly once
+    pending = _pending_delta(product_ids)
+    claims = db.session.query(
+        StockReservation.product_id,
+        db.func.sum(StockReservation.quantity).label('claimed')
+    ).filter(
+        StockReservation.product_id.in_(product_ids),
+        StockReservation.holder.startswith(CHECKOUT_HOLDER),
+        StockReservation.expires_at > datetime.utcnow()
+    ).group_by(StockReservation.product_id).subquery()
+    rows = db.session.query(Product.id, _level_column(pending), db.func.coalesce(claims.c.claimed, 0).label('claimed')) \
+        .outerjoin(pending, pending.c.product_id == Product.id) \
+        .outerjoin(claims, claims.c.product_id == Product.id) \
+        .filter(Product.id.in_(product_ids)).all()
+    available = {row.id: row.level - (row.claimed - quantities[row.id]) for row in rows}
+    shortages = {pid: max(available.get(pid, 0), 0) for pid in product_ids if available.get(pid, 0) < quantities[pid]}
+    if shortages:
+        release_reservations(holder)
+        raise InsufficientStock(shortages)
+
+
+def settle_claim(holder):
+    """Drop a checkout claim in the caller's transaction, alongside the sale movements replacing it"""
+    StockReservation.query.filter_by(holder=holder).delete(synchronize_session=False)
+
+
+def get_reserved_quantities(product_ids, exclude_holder=None):
+    """Quantities held by live cart reservations, optionally ignoring one holder's own"""
+    query = db.session.query(
+        StockReservation.product_id,
+        db.func.sum(StockReservation.quantity).label('reserved')
+    ).filter(
+        StockReservation.product_id.in_(product_ids),
+        StockReservation.expires_at > datetime.utcnow()
+    )
+    if exclude_holder:
+        query = query.filter(StockReservation.holder != exclude_holder)
+    return {row.product_id: row.reserved for row in query.group_by(StockReservation.product_id)}
+
+
+def get_available_stock(product_id, holder=None):
+    """Stock a holder can still put in their cart"""
+    product_id = int(product_id)
+    level = get_stock_level(product_id)
+    reserved = get_reserved_quantities([product_id], exclude_holder=holder).get(product_id, 0)
+    return max(0, level - reserved)
+
+
+def reserve_stock(product_id, quantity, holder, ttl=RESERVATION_TTL):
+    """Create or refresh a holder's reservation for a product"""
+    stmt = dialect_insert(StockReservation.__table__).values(
+        product_id=int(product_id),
+        holder=holder,
+        quantity=quantity,
+        expires_at=datetime.utcnow() + timedelta(seconds=ttl)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_id', 'holder'],
+        set_={'quantity': stmt.excluded.quantity, 'expires_at': stmt.excluded.expires_at}
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+
+
+def release_reservations(holder, product_id=None):
+    query = StockReservation.query.filter_by(holder=holder)
+    if product_id is not None:
+        query = query.filter_by(product_id=int(product_id))
+    query.delete(synchronize_session=False)
+    db.session.commit()
+
+
+def get_low_stock(threshold=LOW_STOCK_THRESHOLD, limit=50, product_ids=None):
+    """Active products whose current stock is below threshold, lowest first"""
+    pending = _pending_delta(product_ids)
+    level = _level_column(pending)
+    query = db.session.query(Product, level) \
+        .outerjoin(pending, pending.c.product_id == Product.id) \
+        .filter(Product.status == 'active', level < threshold)
+    if product_ids is not None:
+        query = query.filter(Product.id.in_(product_ids))
+    return query.order_by(level, Product.id).limit(limit).all()
+
+
+def compact(batch_size=5000):
+    """Fold ledger movements into products.stock_quantity and purge expired reservations.
+
+    Each batch deletes movements with RETURNING and applies exactly the rows it
+    removed, so concurrent compactions and late-committing writers are never
+    counted twice or skipped. The folded products' pages get their stock and
+    units sold refreshed afterwards, which keeps both off the checkout path.
+    Returns the number of movements folded.
+    """
+    folded = 0
+    touched = set()
+    while True:
+        batch = db.select(StockMovement.id).order_by(StockMovement.id).limit(batch_size).scalar_subquery()
+        rows = db.session.execute(
+            db.delete(StockMovement).where(StockMovement.id.in_(batch))
+            .returning(StockMovement.product_id, StockMovement.quantity)
+        ).all()
+        if not rows:
+            break
+
+        deltas = defaultdict(int)
+        for product_id, quantity in rows:
+            deltas[product_id] += quantity
+        touched.update(deltas)
+        # Sorted to take row locks in a consistent order
+        params = [{'pid': pid, 'delta': delta} for pid, delta in sorted(deltas.items()) if delta]
+        if params:
+            products = Product.__table__
+            db.session.execute(
+                db.update(products)
+                .where(products.c.id == bindparam('pid'))
+                .values(stock_quantity=products.c.stock_quantity + bindparam('delta')),
+                params
+            )
+        db.session.commit()
+        folded += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    # Sorted batches again, so the page row locks are short and taken in order
+    touched = sorted(touched)
+    for start in range(0, len(touched), batch_size):
+        chunk = touched[start:start + batch_size]
+        product_pages.refresh_counters(chunk)
+        db.session.commit()
+        # Workers re-read these pages (e.g. autocomplete popularity) instead of rebuilding
+        for at in range(0, len(chunk), events.MAX_IDS_PER_EVENT):
+            Product.after_change(chunk[at:at + events.MAX_IDS_PER_EVENT])
+
+    StockReservation.query.filter(StockReservation.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+    return folded
+
+
+@click.command('inventory-compact')
+@click.option('--batch-size', default=5000, show_default=True)
+@with_appcontext
+def compact_command(batch_size):
+    """Fold the stock ledger into product snapshots. Run periodically (e.g. from cron)."""
+    folded = compact(batch_size=batch_size)
+    click.echo(f'Folded {folded} stock movements')
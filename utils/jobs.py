@@ -0,0 +1,172 @@
+import logging
+import random
+import signal
+import threading
+import traceback
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from models import Job
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Worker threads per queue when none are given on the command line
+DEFAULT_CONCURRENCY = {'default': 2, 'email': 1}
+# A running job whose worker has been silent this long is assumed dead and retried
+LOCK_TIMEOUT = 600
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+
+_handlers = {}
+
+
+def job(name, queue='default', max_attempts=5):
+    """Register a function as the handler for jobs called `name`"""
+    def decorator(f):
+        _handlers[name] = {'func': f, 'queue': queue, 'max_attempts': max_attempts}
+        return f
+    return decorator
+
+
+def _load_handlers():
+    import utils.tasks  # noqa: F401 -- registers handlers on import
+
+
+def enqueue(job_name, /, delay=0, queue=None, commit=False, **payload):
+    """Queue a job inside the current transaction.
+
+    The row is only visible to workers once the caller's transaction commits,
+    so a rolled back request never leaves side effects behind.
+    """
+    _load_handlers()
+    handler = _handlers.get(job_name)
+    if handler is None:
+        raise ValueError(f'Unknown job: {job_name}')
+
+    job_row = Job(
+        name=job_name,
+        queue=queue or handler['queue'],
+        payload=payload,
+        max_attempts=handler['max_attempts'],
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job_row)
+    if commit:
+        db.session.commit()
+    return job_row
+
+
+def _claimable(now):
+    return db.or_(
+        db.and_(Job.status == 'queued', Job.run_at <= now),
+        db.and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=LOCK_TIMEOUT))
+    )
+
+
+def claim_next(queue):
+    """Atomically take the next due job on `queue`, or return None"""
+    now = datetime.utcnow()
+    candidates = db.session.query(Job.id).filter(
+        Job.queue == queue, _claimable(now)
+    ).order_by(Job.run_at, Job.id).limit(5).all()
+
+    for (job_id,) in candidates:
+        # Conditional update: only one worker can move the row out of its claimable state
+        claimed = Job.query.filter(Job.id == job_id, _claimable(now)).update({
+            'status': 'running',
+            'locked_at': now,
+            'attempts': Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_job(job_row):
+    handler = _handlers.get(job_row.name)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for {job_row.name}')
+        handler['func'](**job_row.payload)
+    except Exception:
+        db.session.rollback()
+        job_row = db.session.get(Job, job_row.id)
+        job_row.last_error = traceback.format_exc()[-4000:]
+        if job_row.attempts >= job_row.max_attempts:
+            job_row.status = 'failed'
+            logger.error('Job %s (%s) failed permanently after %s attempts', job_row.id, job_row.name, job_row.attempts)
+        else:
+            backoff = min(BACKOFF_BASE * 2 ** (job_row.attempts - 1), BACKOFF_MAX)
+            job_row.status = 'queued'
+            job_row.run_at = datetime.utcnow() + timedelta(seconds=backoff * random.uniform(0.8, 1.2))
+            logger.warning('Job %s (%s) failed, retrying in ~%ss', job_row.id, job_row.name, backoff)
+    else:
+        job_row.status = 'done'
+        job_row.last_error = None
+    job_row.locked_at = None
+    db.session.commit()
+
+
+def _worker_loop(app, queue, stop_event, poll_interval, burst):
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                job_row = claim_next(queue)
+                if job_row is not None:
+                    run_job(job_row)
+                    continue
+            except Exception:
+                logger.exception('Job worker on queue %s hit an error', queue)
+                db.session.rollback()
+        if burst:
+            return
+        stop_event.wait(poll_interval)
+
+
+def run_worker(app, concurrency, poll_interval=1.0, burst=False):
+    """Run `concurrency[queue]` worker threads per queue until stopped"""
+    _load_handlers()
+    stop_event = threading.Event()
+    threads = []
+    for queue, count in concurrency.items():
+        for i in range(count):
+            thread = threading.Thread(
+                target=_worker_loop,
+                args=(app, queue, stop_event, poll_interval, burst),
+                name=f'jobs-{queue}-{i}',
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+
+    if not burst:
+        signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+
+@click.command('jobs-worker')
+@click.option('--queue', '-q', 'queues', multiple=True,
+              help='Queue to work, optionally with a thread count, e.g. -q email=2. Repeatable.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to sleep when a queue is empty.')
+@click.option('--burst', is_flag=True, help='Exit once every queue is drained.')
+@with_appcontext
+def worker_command(queues, poll_interval, burst):
+    """Process background jobs."""
+    concurrency = {}
+    for spec in queues:
+        name, _, count = spec.partition('=')
+        concurrency[name] = int(count or 1)
+    concurrency = concurrency or DEFAULT_CONCURRENCY
+
+    click.echo(f'Working queues: {", ".join(f"{q}={n}" for q, n in concurrency.items())}')
+    run_worker(current_app._get_current_object(), concurrency, poll_interval=poll_interval, burst=burst)
@@ -0,0 +1,51 @@
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed via extra= and is structured data
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Keep only a fraction of DEBUG records; INFO and above always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+def configure_logging():
+    """Configure the root logger from LOG_LEVEL, LOG_FORMAT and LOG_DEBUG_SAMPLE_RATE"""
+    handler = logging.StreamHandler()
+    if os.environ.get('LOG_FORMAT', 'json') == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+    handler.addFilter(SampleFilter(float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.01'))))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
@@ -0,0 +1,257 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; chosen around the latencies a storefront page can plausibly have
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Each worker writes its own snapshot file at most this often
+FLUSH_INTERVAL = 5.0
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency, by endpoint'),
+    'http_requests_in_flight': ('gauge', 'Requests currently being handled'),
+    'db_queries_total': ('counter', 'SQL statements executed, by endpoint'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in SQL statements, by endpoint'),
+    'cache_invalidations_total': ('counter', 'Change events applied to worker-local caches, by entity and source'),
+    'cache_invalidation_lag_seconds': ('histogram', 'Delay between publishing a change event and another worker receiving it'),
+    'http_requests_shed_total': ('counter', 'Requests refused by rate limiting or load shedding, by endpoint, priority and reason'),
+}
+
+
+class Registry:
+    """Per-process metric values, periodically snapshotted to a file per pid"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = defaultdict(float)
+        self.histograms = {}
+        self.last_flush = 0.0
+        self.directory = None
+
+    def inc(self, name, labels, value=1.0):
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def add_gauge(self, name, labels, value):
+        with self.lock:
+            self.gauges[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            hist = self.histograms.get((name, labels))
+            if hist is None:
+                hist = self.histograms[(name, labels)] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            hist[-2] += value
+            hist[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[n, list(l), v] for (n, l), v in self.counters.items()],
+                'gauges': [[n, list(l), v] for (n, l), v in self.gauges.items()],
+                'histograms': [[n, list(l), list(h)] for (n, l), h in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not self.directory or (not force and now - self.last_flush < FLUSH_INTERVAL):
+            return
+        self.last_flush = now
+        data = self.snapshot()
+        _write(self.directory, f'metrics-{data["pid"]}.json', data)
+
+
+registry = Registry()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(paths, include_dead=False):
+    counters = defaultdict(float)
+    gauges = defaultdict(float)
+    histograms = {}
+    for path in paths:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        # A dead process's totals only count once folded into the archive
+        if data['pid'] is not None and not (include_dead or _pid_alive(data['pid'])):
+            continue
+        for name, labels, value in data['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        if data['pid'] is not None:
+            for name, labels, value in data['gauges']:
+                gauges[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, values in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = values
+    return counters, gauges, histograms
+
+
+def _write(directory, name, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def collect():
+    """Merge the snapshots of live workers and the archive of exited ones"""
+    registry.flush(force=True)
+    return _merge(glob.glob(os.path.join(registry.directory, 'metrics-*.json')))
+
+
+def metrics_dir():
+    return os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'spice-metrics')
+
+
+def reset_directory(directory):
+    """Remove every snapshot, like prometheus_client's multiprocess mode; call in the master before forking"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        os.remove(path)
+
+
+def mark_process_dead(pid, directory=None):
+    """Fold an exited worker's counters and histograms into the archive snapshot and drop its file.
+
+    Totals stay monotonic across worker restarts while the directory holds
+    one file per live worker plus the archive. Call from the master only.
+    """
+    directory = directory or metrics_dir()
+    path = os.path.join(directory, f'metrics-{pid}.json')
+    if not os.path.exists(path):
+        return
+    archive = os.path.join(directory, 'metrics-archive.json')
+    counters, _, histograms = _merge([archive, path], include_dead=True)
+    _write(directory, 'metrics-archive.json', {
+        'pid': None,
+        'counters': [[n, list(l), v] for (n, l), v in counters.items()],
+        'gauges': [],
+        'histograms': [[n, list(l), list(h)] for (n, l), h in histograms.items()],
+    })
+    os.remove(path)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    counters, gauges, histograms = collect()
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append(f'{name}{_format_labels(labels)} {value}')
+    for (name, labels), value in gauges.items():
+        by_name[name].append(f'{name}{_format_labels(labels)} {value}')
+    for (name, labels), values in histograms.items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS, values):
+            cumulative += count
+            by_name[name].append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+        by_name[name].append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-1]}')
+        by_name[name].append(f'{name}_sum{_format_labels(labels)} {values[-2]}')
+        by_name[name].append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(sorted(by_name[name]))
+    return '\n'.join(lines) + '\n'
+
+
+def _endpoint_labels():
+    endpoint = request.endpoint or 'unmatched'
+    return (('blueprint', request.blueprint or ''), ('endpoint', endpoint))
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.db_time = 0.0
+    g.db_queries = 0
+    registry.add_gauge('http_requests_in_flight', (), 1)
+
+
+def _after_request(response):
+    labels = _endpoint_labels()
+    registry.inc('http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+    return response
+
+
+def _teardown_request(exc):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    labels = _endpoint_labels()
+    registry.observe('http_request_duration_seconds', labels, time.perf_counter() - start)
+    registry.inc('db_queries_total', labels, g.get('db_queries', 0))
+    registry.inc('db_query_duration_seconds_total', labels, g.get('db_time', 0.0))
+    registry.add_gauge('http_requests_in_flight', (), -1)
+    registry.flush()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context rather than the connection, so a statement that
+    # raises (and never reaches after_cursor_execute) leaves nothing behind
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    if has_app_context() and 'db_time' in g:
+        g.db_time += elapsed
+        g.db_queries += 1
+
+
+def init_app(app):
+    """Record request and DB timings; snapshots go to METRICS_DIR so all workers can be merged"""
+    directory = app.config.get('METRICS_DIR') or metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    registry.directory = directory
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    atexit.register(registry.flush, force=True)
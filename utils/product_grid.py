@@ -0,0 +1,155 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from models import Product, Category, ProductPage, StockMovement
+from extensions import db
+from utils.inventory import get_stock_levels
+from utils import product_pages
+from utils.db import encode_cursor, decode_cursor, keyset_after, keyset_order
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BULK_IDS = 5000
+
+# sort key -> (column, parser for the cursor value)
+SORT_COLUMNS = {
+    'id': (Product.id, int),
+    'name': (Product.name, str),
+    'price': (Product.price, Decimal),
+    # The level as of the last compaction; sales do not write to the read model
+    'stock': (ProductPage.stock_quantity, int),
+    'created': (Product.created_at, datetime.fromisoformat),
+}
+
+
+class GridError(ValueError):
+    pass
+
+
+def query_page(search=None, status=None, category_id=None, sort='id', descending=False, cursor=None, limit=PAGE_SIZE):
+    """One page of admin product rows in (sort, id) order.
+
+    Pages are addressed with a keyset cursor rather than an offset, so the
+    cost of fetching page N does not grow with N and nothing is counted.
+    """
+    if sort not in SORT_COLUMNS:
+        raise GridError('Unknown sort')
+    column, parse = SORT_COLUMNS[sort]
+    # product_pages is outer-joined, so a product without a page yet sorts as NULL
+    nullable = column is ProductPage.stock_quantity
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = db.session.query(
+        Product.id, Product.name, Product.sku, Product.image, Product.price,
+        ProductPage.stock_quantity, Product.status, Product.created_at, Category.name.label('category')
+    ).join(Category, Category.id == Product.category_id) \
+        .outerjoin(ProductPage, ProductPage.product_id == Product.id)
+    if search:
+        term = search.strip()
+        query = query.filter(db.or_(Product.name.ilike(f'%{term}%'), Product.sku.ilike(f'{term}%')))
+    if status in ('active', 'inactive'):
+        query = query.filter(Product.status == status)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    if cursor:
+        try:
+            sort_value, last_id = decode_cursor(cursor, parse, int)
+        except ValueError as e:
+            raise GridError(str(e))
+        query = query.filter(keyset_after(column, sort_value, Product.id, last_id, descending, nullable))
+
+    rows = query.order_by(*keyset_order(column, Product.id, descending, nullable)).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # Shown stock is always the live ledger level
+    levels = get_stock_levels([row.id for row in rows])
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, column.key), last.id)
+
+    return {
+        'rows': [{
+            'id': row.id,
+            'name': row.name,
+            'sku': row.sku,
+            'image': row.image,
+            'category': row.category,
+            'price': float(row.price),
+            'stock': levels.get(row.id, 0),
+            'status': row.status,
+        } for row in rows],
+        'next_cursor': next_cursor,
+    }
+
+
+def _parse_ids(ids):
+    try:
+        ids = sorted({int(i) for i in ids})
+    except (TypeError, ValueError):
+        raise GridError('Invalid product ids')
+    if not ids:
+        raise GridError('No products selected')
+    if len(ids) > MAX_BULK_IDS:
+        raise GridError(f'At most {MAX_BULK_IDS} products can be updated at once')
+    return ids
+
+
+def bulk_update(ids, action, value=None, actor=None):
+    """Apply one action to many products with a single set-based statement.
+
+    Returns the number of products affected. The caller's session is committed.
+    """
+    ids = _parse_ids(ids)
+    selected = Product.query.filter(Product.id.in_(ids))
+
+    if action == 'deactivate':
+        count = selected.update({Product.status: 'inactive'}, synchronize_session=False)
+    elif action == 'reactivate':
+        count = selected.update({Product.status: 'active'}, synchronize_session=False)
+    elif action == 'set_price':
+        try:
+            price = Decimal(str(value)).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            raise GridError('Invalid price')
+        if price <= 0:
+            raise GridError('Price must be positive')
+        count = selected.update({Product.price: price}, synchronize_session=False)
+    elif action == 'change_category':
+        try:
+            category_id = int(value)
+        except (TypeError, ValueError):
+            raise GridError('Invalid category')
+        if not db.session.get(Category, category_id):
+            raise GridError('Category not found')
+        count = selected.update({Product.category_id: category_id}, synchronize_session=False)
+    elif action == 'adjust_stock':
+        try:
+            delta = int(value)
+        except (TypeError, ValueError):
+            raise GridError('Invalid stock adjustment')
+        if delta == 0:
+            raise GridError('Stock adjustment must be non-zero')
+        # Ledger rows for every selected product in one INSERT ... SELECT
+        reference = f'admin:{actor}' if actor else 'admin:bulk'
+        source = db.select(
+            Product.id,
+            db.literal(delta, db.Integer),
+            db.literal('adjustment', db.String),
+            db.literal(reference, db.String),
+            db.literal(datetime.utcnow(), db.DateTime),
+        ).where(Product.id.in_(ids))
+        result = db.session.execute(db.insert(StockMovement).from_select(
+            ['product_id', 'quantity', 'kind', 'reference', 'created_at'], source
+        ))
+        count = result.rowcount
+        product_pages.set_in_stock(get_stock_levels(ids))
+    else:
+        raise GridError('Unknown action')
+
+    if action != 'adjust_stock':
+        Product.refresh_pages(ids)
+    db.session.commit()
+    if action != 'adjust_stock':
+        Product.after_change(ids)
+    return count
@@ -0,0 +1,148 @@
+import logging
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam
+from models import Product, Category, ProductPage, OrderItem
+from extensions import db
+from utils.db import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+def _image_url(image):
+    if not image:
+        return None
+    # Absolute URLs and site paths are used as given; anything else lives under static/
+    if image.startswith(('http', '/')):
+        return image
+    return f"{current_app.static_url_path}/{image.lstrip('/')}"
+
+
+def _discount_percent(price, original_price):
+    if original_price is None or original_price <= price:
+        return None
+    return int(round((original_price - price) * 100 / original_price))
+
+
+def _documents(product_ids):
+    from utils.inventory import get_stock_levels
+    rows = db.session.query(Product, Category.name, Category.slug) \
+        .join(Category, Category.id == Product.category_id) \
+        .filter(Product.id.in_(product_ids)).all()
+    # Stock is the ledger level, not the compacted snapshot
+    levels = get_stock_levels(product_ids)
+    sold = _units_sold(product_ids)
+    now = datetime.utcnow()
+    return [{
+        'product_id': product.id,
+        'status': product.status or 'active',
+        'name': product.name,
+        'description': product.description,
+        'sku': product.sku,
+        'price': product.price,
+        'original_price': product.original_price,
+        'discount_percent': _discount_percent(product.price, product.original_price),
+        'stock_quantity': levels.get(product.id, product.stock_quantity),
+        'in_stock': levels.get(product.id, product.stock_quantity) > 0,
+        'units_sold': sold.get(product.id, 0),
+        'image_url': _image_url(product.image),
+        'category_id': product.category_id,
+        'category_name': category_name,
+        'category_slug': category_slug,
+        'created_at': product.created_at,
+        'updated_at': now,
+    } for product, category_name, category_slug in rows]
+
+
+def _units_sold(product_ids):
+    sold = OrderItem.units_sold(product_ids)
+    return {product_id: int(units) for product_id, units in db.session.execute(db.select(sold))}
+
+
+def _upsert(documents):
+    stmt = dialect_insert(ProductPage.__table__).values(documents)
+    stmt = stmt.on_conflict_do_update(index_elements=['product_id'], set_={
+        name: stmt.excluded[name] for name in documents[0] if name != 'product_id'
+    })
+    db.session.execute(stmt)
+
+
+def refresh(product_ids):
+    """Rebuild these products' documents in the caller's transaction"""
+    product_ids = sorted({int(i) for i in product_ids})
+    if not product_ids:
+        return
+    documents = _documents(product_ids)
+    if documents:
+        _upsert(documents)
+
+
+def set_in_stock(levels):
+    """Bring in_stock in line with {product_id: level}; pages that already agree are not written"""
+    params = [{'pid': pid, 'flag': level > 0} for pid, level in sorted(levels.items())]
+    if not params:
+        return
+    pages = ProductPage.__table__
+    db.session.execute(
+        db.update(pages).where(pages.c.product_id == bindparam('pid'), pages.c.in_stock != bindparam('flag'))
+        .values(in_stock=bindparam('flag')),
+        params
+    )
+
+
+def refresh_counters(product_ids):
+    """Copy the ledger level and units sold onto these documents in the caller's transaction.
+
+    Only compaction calls this, for the products whose movements it folded:
+    stock_quantity and units_sold on a page are as of the last compaction,
+    for sorting, and pages show the live ledger level.
+    """
+    from utils.inventory import get_stock_levels
+    sold = _units_sold(product_ids)
+    params = [{'pid': pid, 'level': level, 'sold': sold.get(pid, 0)}
+              for pid, level in sorted(get_stock_levels(product_ids).items())]
+    if not params:
+        return
+    pages = ProductPage.__table__
+    level = bindparam('level', type_=db.Integer)
+    db.session.execute(
+        db.update(pages).where(pages.c.product_id == bindparam('pid'))
+        .values(stock_quantity=level, in_stock=level > 0, units_sold=bindparam('sold')),
+        params
+    )
+
+
+def backfill(batch_size=1000):
+    """Rebuild every product's document, one committed batch at a time; returns the count"""
+    count = 0
+    after_id = 0
+    while True:
+        product_ids = [product_id for product_id, in db.session.query(Product.id)
+                       .filter(Product.id > after_id).order_by(Product.id).limit(batch_size)]
+        if not product_ids:
+            break
+        documents = _documents(product_ids)
+        if documents:
+            _upsert(documents)
+        db.session.commit()
+        count += len(documents)
+        after_id = product_ids[-1]
+    logger.info('product pages rebuilt', extra={'products': count})
+    return count
+
+
+def backfill_if_empty():
+    """Fill the read model on first start against an existing catalog"""
+    if db.session.query(ProductPage.product_id).first() is None \
+            and db.session.query(Product.id).first() is not None:
+        backfill()
+
+
+@click.command('product-pages-backfill')
+@click.option('--batch-size', default=1000, show_default=True)
+@with_appcontext
+def backfill_command(batch_size):
+    """Rebuild the storefront product read model from the products table."""
+    count = backfill(batch_size=batch_size)
+    click.echo(f'Rebuilt {count} product pages')
@@ -0,0 +1,167 @@
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from flask import g, request
+from flask_login import current_user
+from utils.cooperative import gevent_active
+from utils.files import private_dir
+
+logger = logging.getLogger(__name__)
+
+# Profiles kept on disk; older ones are pruned as new ones are written
+MAX_PROFILES = 200
+_NAME_RE = re.compile(r'^(\d+)-([\w.]+)-(\d+)ms\.(pstats|collapsed)$')
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class RequestProfiler:
+    """Profiles whole requests, either on admin request or for a random 1-in-N sample.
+
+    Admins opt in per request with an ``X-Profile: 1`` header or a ``profile=1``
+    cookie. PROFILER_MODE picks cProfile (``cprofile``, deterministic but slow)
+    or the stack sampler (``sample``, collapsed stacks for flame graphs). Under
+    gevent every request shares the hub's thread, so the sampler cannot tell
+    them apart and cProfile is used instead.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.sample_rate = 0
+        self.mode = 'sample'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        directory = app.config.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'spice-profiles')
+        self.sample_rate = int(app.config.get('PROFILE_SAMPLE_RATE') or 0)
+        self.mode = app.config.get('PROFILER_MODE') or 'sample'
+        # Profiles hold SQL and code paths and are served to admins; nobody else may write them
+        try:
+            private = private_dir(directory)
+        except OSError:
+            private = False
+        if not private:
+            logger.warning('request profiler disabled; profile directory is not private to this user',
+                           extra={'directory': directory})
+            return
+        # Ours, so also keep other users from reading it
+        os.chmod(directory, 0o700)
+        self.directory = directory
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _requested(self):
+        opted_in = request.headers.get('X-Profile') == '1' or request.cookies.get('profile') == '1'
+        if opted_in and current_user.is_authenticated and current_user.role == 'admin':
+            return True
+        return self.sample_rate > 0 and random.randrange(self.sample_rate) == 0
+
+    def _before_request(self):
+        if request.endpoint == 'static' or not self._requested():
+            return
+        # Checked per request: gevent patches the worker after the app may have been imported
+        if self.mode == 'cprofile' or gevent_active():
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this interpreter
+                return
+        else:
+            profiler = StackSampler(threading.get_ident())
+            profiler.start()
+        g.request_profiler = profiler
+        g.request_profile_start = time.perf_counter()
+
+    def _teardown_request(self, exc):
+        profiler = g.pop('request_profiler', None)
+        if profiler is None:
+            return
+        elapsed_ms = int((time.perf_counter() - g.pop('request_profile_start')) * 1000)
+        endpoint = request.endpoint or 'unmatched'
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            path = self._path(endpoint, elapsed_ms, 'pstats')
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            path = self._path(endpoint, elapsed_ms, 'collapsed')
+            profiler.dump(path)
+        self._prune()
+
+    def _path(self, endpoint, elapsed_ms, ext):
+        return os.path.join(self.directory, f'{int(time.time() * 1000)}-{endpoint}-{elapsed_ms}ms.{ext}')
+
+    def _prune(self):
+        names = sorted(n for n in os.listdir(self.directory) if _NAME_RE.match(n))
+        for name in names[:-MAX_PROFILES]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def list_profiles(self):
+        """Stored profiles, newest first"""
+        if self.directory is None:
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            match = _NAME_RE.match(name)
+            if not match:
+                continue
+            timestamp, endpoint, elapsed_ms, kind = match.groups()
+            profiles.append({
+                'name': name,
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(timestamp) / 1000)),
+                'endpoint': endpoint,
+                'duration_ms': int(elapsed_ms),
+                'kind': kind,
+                'size': os.path.getsize(os.path.join(self.directory, name)),
+            })
+        return sorted(profiles, key=lambda p: p['name'], reverse=True)
+
+    def is_profile(self, name):
+        return self.directory is not None and bool(_NAME_RE.match(name))
+
+
+request_profiler = RequestProfiler()
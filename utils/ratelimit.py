@@ -0,0 +1,311 @@
+import hashlib
+import logging
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from flask import Response, g, jsonify, request
+from flask_login import current_user
+from utils import metrics
+from utils.files import private_dir
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> (requests per minute, burst, methods); buckets are per user, or per IP when anonymous
+LIMITS = {
+    'products.cart_count': (60, 20, ('GET',)),
+    'products.add_to_cart_route': (30, 10, ('POST',)),
+    # Every attempt pays a password hash, and guessing should be slow anyway; always per IP
+    'auth.login': (10, 5, ('POST',)),
+}
+
+CRITICAL, NORMAL, LOW = 'critical', 'normal', 'low'
+# Endpoints not listed are NORMAL. CRITICAL is never shed.
+PRIORITIES = {
+    'main.checkout': CRITICAL,
+    'products.cart_count': LOW,
+    'api.products': LOW,
+    'api.product_detail': LOW,
+    'api.categories': LOW,
+    'api.autocomplete': LOW,
+}
+
+# Shed LOW requests once this share of the host's worker capacity is busy...
+SHED_LOW_OCCUPANCY = float(os.environ.get('SHED_LOW_OCCUPANCY', 0.75))
+# ...or once requests wait this long in the proxy/listen queue (needs X-Request-Start)
+SHED_LOW_QUEUE_MS = float(os.environ.get('SHED_LOW_QUEUE_MS', 100))
+# NORMAL requests are shed only when the queue is this long
+SHED_NORMAL_QUEUE_MS = float(os.environ.get('SHED_NORMAL_QUEUE_MS', 1000))
+# Requests one worker handles at once: 1 for sync workers
+WORKER_CAPACITY = int(os.environ.get('SHED_WORKER_CAPACITY', 1))
+
+BUCKET_TTL = 3600
+SWEEP_INTERVAL = 10.0
+# Workers count their own requests in memory and share the count at most this often
+PUBLISH_INTERVAL = 1.0
+# A count not republished for this long is ignored: idle workers have nothing to publish
+BUSY_TTL = 5.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_load (
+    pid INTEGER PRIMARY KEY, in_flight INTEGER NOT NULL, capacity INTEGER NOT NULL, updated REAL NOT NULL
+);
+'''
+
+# Refill by elapsed time, then take a token if a whole one is there; one statement, so
+# concurrent workers never both spend the last token
+TAKE = '''
+INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :burst - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    allowed = min(:burst, tokens + (:now - updated) * :rate) >= 1,
+    tokens = min(:burst, tokens + (:now - updated) * :rate)
+             - (min(:burst, tokens + (:now - updated) * :rate) >= 1),
+    updated = :now
+RETURNING allowed, tokens
+'''
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class LocalStore:
+    """Token buckets and worker occupancy in a SQLite file shared by the workers on this host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._published = 0.0
+        # (busy, capacity) of the other workers as last read
+        self._others = (0, 0)
+
+    def _conn(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            # Never reuse a connection inherited across fork
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.executescript(SCHEMA)
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def take(self, key, rate, burst):
+        """Spend one token from `key`'s bucket; returns (allowed, seconds until one is available)"""
+        now = time.time()
+        conn = self._conn()
+        allowed, tokens = conn.execute(TAKE, {'key': key, 'rate': rate, 'burst': burst, 'now': now}).fetchone()
+        if random.random() < 0.001:
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - BUCKET_TTL,))
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / rate
+
+    def register(self, capacity=WORKER_CAPACITY):
+        self._published = 0.0
+        self._refresh(0, capacity)
+
+    def enter(self, capacity=WORKER_CAPACITY):
+        """Count a request in this worker; returns the share of capacity busy with other requests"""
+        with self._lock:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        busy, total = self._refresh(in_flight, capacity)
+        return (busy + max(min(in_flight, capacity) - 1, 0)) / (total + capacity)
+
+    def leave(self, capacity=WORKER_CAPACITY):
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            in_flight = self._in_flight
+        self._refresh(in_flight, capacity)
+
+    def _refresh(self, in_flight, capacity):
+        """Publish this worker's count and reread the others', at most once per PUBLISH_INTERVAL.
+
+        Between refreshes nothing touches SQLite, so requests never queue
+        behind each other's write transactions; the other workers' load is
+        up to PUBLISH_INTERVAL old, this worker's is exact.
+        """
+        now = time.monotonic()
+        if now - self._published < PUBLISH_INTERVAL:
+            return self._others
+        self._published = now
+        conn = self._conn()
+        pid, wall = os.getpid(), time.time()
+        conn.execute(
+            'INSERT INTO worker_load (pid, in_flight, capacity, updated) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (pid) DO UPDATE SET in_flight = excluded.in_flight, '
+            'capacity = excluded.capacity, updated = excluded.updated',
+            (pid, in_flight, capacity, wall)
+        )
+        self._sweep(conn)
+        busy, total = conn.execute(
+            'SELECT coalesce(sum(CASE WHEN updated >= ? THEN min(in_flight, capacity) ELSE 0 END), 0), '
+            'coalesce(sum(capacity), 0) FROM worker_load WHERE pid != ?',
+            (wall - BUSY_TTL, pid)
+        ).fetchone()
+        self._others = (busy, total)
+        return self._others
+
+    def _sweep(self, conn):
+        # Workers that died mid-request would otherwise look busy forever
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        dead = [pid for pid, in conn.execute('SELECT pid FROM worker_load') if not _pid_alive(pid)]
+        if dead:
+            conn.executemany('DELETE FROM worker_load WHERE pid = ?', [(pid,) for pid in dead])
+
+
+_store = None
+_last_error = 0.0
+
+
+def _fail_open(action):
+    # A broken store must not take the site down; log at most once a minute
+    global _last_error
+    if time.monotonic() - _last_error > 60:
+        _last_error = time.monotonic()
+        logger.warning('rate limit store unavailable; allowing requests', exc_info=True, extra={'action': action})
+
+
+def queue_wait_ms():
+    """Time since the front proxy received the request, from X-Request-Start (t=<sec|ms|µs>)"""
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        started = float(header.replace('t=', '', 1).strip())
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max((time.time() - started) * 1000, 0.0)
+
+
+def _shed_reason(priority, occupancy):
+    waited = queue_wait_ms()
+    if priority == LOW:
+        if occupancy >= SHED_LOW_OCCUPANCY:
+            return 'occupancy'
+        if waited is not None and waited >= SHED_LOW_QUEUE_MS:
+            return 'queue'
+    elif waited is not None and waited >= SHED_NORMAL_QUEUE_MS:
+        return 'queue'
+    return None
+
+
+def _client_key(endpoint):
+    if endpoint != 'auth.login' and current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{request.remote_addr}'
+
+
+def _reject(status, priority, reason, retry_after):
+    endpoint = request.endpoint
+    metrics.registry.inc('http_requests_shed_total', (
+        ('endpoint', endpoint), ('priority', priority), ('reason', reason), ('status', str(status))
+    ))
+    message = 'Too many requests' if status == 429 else 'Service busy, please retry'
+    if request.blueprint == 'api' or not request.accept_mimetypes.accept_html:
+        response = jsonify({'error': message})
+        response.status_code = status
+    else:
+        response = Response(message, status=status, mimetype='text/plain')
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _before_request():
+    endpoint = request.endpoint
+    # Static files are cheap and a page is broken without its CSS/JS; never limit or shed them
+    if endpoint is None or endpoint == 'static':
+        return None
+    priority = PRIORITIES.get(endpoint, NORMAL)
+    # The in-memory count is taken before any SQLite work, so leave() must follow even on error
+    g.ratelimit_entered = True
+    try:
+        occupancy = _store.enter()
+    except sqlite3.Error:
+        _fail_open('enter')
+        occupancy = 0.0
+
+    if priority != CRITICAL:
+        reason = _shed_reason(priority, occupancy)
+        if reason:
+            return _reject(503, priority, reason, 1)
+
+    limit = LIMITS.get(endpoint)
+    if limit and request.method in limit[2]:
+        per_minute, burst, _ = limit
+        try:
+            allowed, retry_after = _store.take(f'{endpoint}:{_client_key(endpoint)}', per_minute / 60.0, burst)
+        except sqlite3.Error:
+            _fail_open('take')
+            return None
+        if not allowed:
+            return _reject(429, priority, 'rate_limit', retry_after)
+    return None
+
+
+def _teardown_request(exc):
+    if g.pop('ratelimit_entered', False):
+        try:
+            _store.leave()
+        except sqlite3.Error:
+            _fail_open('leave')
+
+
+def store_path(app):
+    """The shared store file, or None if its default directory could be tampered with"""
+    path = os.environ.get('RATE_LIMIT_DB')
+    if path:
+        return path
+    # One file per checkout, shared by every worker started from it. Another local user
+    # could pre-create or lock a file in the shared temp dir and make the limiter fail open
+    digest = hashlib.sha1(app.root_path.encode()).hexdigest()[:12]
+    directory = os.path.join(tempfile.gettempdir(), f'spice-ratelimit-{digest}')
+    try:
+        if private_dir(directory):
+            return os.path.join(directory, 'limits.db')
+    except OSError:
+        pass
+    logger.warning('rate limiting disabled; store directory is not private to this user (set RATE_LIMIT_DB)',
+                   extra={'directory': directory})
+    return None
+
+
+def register_worker():
+    """Count this worker's capacity before its first request; call after fork"""
+    if _store is not None:
+        try:
+            _store.register()
+        except sqlite3.Error:
+            _fail_open('register')
+
+
+def init_app(app):
+    """Per-client rate limits and priority load shedding; RATE_LIMITING=0 turns both off"""
+    global _store
+    if os.environ.get('RATE_LIMITING', '1') == '0':
+        return
+    path = store_path(app)
+    if path is None:
+        return
+    _store = LocalStore(path)
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
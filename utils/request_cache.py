@@ -0,0 +1,31 @@
+from functools import wraps
+from flask import g, has_app_context
+
+
+def request_cached(name):
+    """Memoize a function's result on flask.g for the rest of the request.
+
+    Arguments are part of the key. Outside an app context the function is
+    simply called.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not has_app_context():
+                return f(*args, **kwargs)
+            memo = g.setdefault('request_memo', {})
+            key = (name, args, tuple(sorted(kwargs.items())))
+            if key not in memo:
+                memo[key] = f(*args, **kwargs)
+            return memo[key]
+        return decorated_function
+    return decorator
+
+
+def forget(name):
+    """Drop memoized results for `name`, e.g. after the underlying data changed"""
+    if has_app_context():
+        memo = g.get('request_memo')
+        if memo:
+            for key in [k for k in memo if k[0] == name]:
+                del memo[key]
@@ -0,0 +1,243 @@
+import marshal
+import pickle
+import secrets
+import threading
+import zlib
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from models import ServerSession
+from extensions import db
+from utils.db import dialect_insert
+
+# Payloads larger than this are zlib-compressed before storage
+COMPRESS_THRESHOLD = 512
+
+_RAW, _ZLIB, _PICKLE, _PICKLE_ZLIB = b'\x00', b'\x01', b'\x02', b'\x03'
+
+
+def encode(data):
+    """Compact binary form of a session dict.
+
+    Sessions only ever hold plain values, which marshal writes compactly and
+    quickly; anything it rejects (e.g. str subclasses) falls back to pickle.
+    The bytes never leave the server, so both are safe to load back.
+    """
+    try:
+        payload, raw, compressed = marshal.dumps(data), _RAW, _ZLIB
+    except ValueError:
+        payload, raw, compressed = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), _PICKLE, _PICKLE_ZLIB
+    if len(payload) > COMPRESS_THRESHOLD:
+        return compressed + zlib.compress(payload)
+    return raw + payload
+
+
+def decode(blob):
+    kind, payload = blob[:1], blob[1:]
+    if kind in (_ZLIB, _PICKLE_ZLIB):
+        payload = zlib.decompress(payload)
+    if kind in (_PICKLE, _PICKLE_ZLIB):
+        return pickle.loads(payload)
+    return marshal.loads(payload)
+
+
+class MemorySessionStore:
+    """Process-local store for development and tests; not shared between workers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+        if entry is None or entry[1] <= datetime.utcnow():
+            return None
+        return entry[0]
+
+    def save(self, sid, blob, expires_at):
+        with self._lock:
+            self._data[sid] = (blob, expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def cleanup(self):
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._data.items() if expires_at <= now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+
+class DatabaseSessionStore:
+    """Sessions in the primary database's sessions table.
+
+    Uses its own connections rather than db.session so saving a session never
+    commits or pins the request's own transaction.
+    """
+
+    table = ServerSession.__table__
+
+    def load(self, sid):
+        with db.engine.connect() as conn:
+            return conn.execute(
+                db.select(self.table.c.data).where(
+                    self.table.c.sid == sid,
+                    self.table.c.expires_at > datetime.utcnow()
+                )
+            ).scalar()
+
+    def save(self, sid, blob, expires_at):
+        stmt = dialect_insert(self.table).values(sid=sid, data=blob, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['sid'],
+            set_={'data': stmt.excluded.data, 'expires_at': stmt.excluded.expires_at}
+        )
+        with db.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(db.delete(self.table).where(self.table.c.sid == sid))
+
+    def cleanup(self):
+        with db.engine.begin() as conn:
+            return conn.execute(
+                db.delete(self.table).where(self.table.c.expires_at <= datetime.utcnow())
+            ).rowcount
+
+
+class ServerSideSession(SessionMixin):
+    """Session whose data is fetched from the store on first access"""
+
+    def __init__(self, sid, loader=None, new=False):
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self.previous_sid = None
+        self._loader = loader
+        self._data = None if loader else {}
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        self.accessed = True
+        if self._data is None:
+            self._data = self._loader() or {}
+        return self._data
+
+    def regenerate(self):
+        """Move the data to a fresh id, e.g. on login, so a planted id is useless"""
+        self.data  # load before the old id is discarded
+        self.previous_sid = self.previous_sid or self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data server-side; the cookie carries only a signed session id.
+
+    The store is read lazily when a view first touches the session and written
+    back only when the session was modified.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                return ServerSideSession(sid, loader=lambda: self._load(sid))
+        return ServerSideSession(secrets.token_urlsafe(32), new=True)
+
+    def _load(self, sid):
+        blob = self.store.load(sid)
+        if blob is None:
+            return None
+        try:
+            return decode(blob)
+        except Exception:
+            return None
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.modified:
+            return
+
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        self.store.save(session.sid, encode(dict(session)), datetime.utcnow() + app.permanent_session_lifetime)
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def init_app(app, backend):
+    """Install the server-side session backend named by SESSION_BACKEND ('db', 'memory' or 'cookie')"""
+    if backend == 'cookie':
+        return
+    store = MemorySessionStore() if backend == 'memory' else DatabaseSessionStore()
+    app.session_interface = ServerSideSessionInterface(store)
+
+
+@click.command('sessions-cleanup')
+@with_appcontext
+def cleanup_command():
+    """Delete expired server-side sessions."""
+    interface = current_app.session_interface
+    if not isinstance(interface, ServerSideSessionInterface):
+        click.echo('Server-side sessions are not enabled')
+        return
+    click.echo(f'Deleted {interface.store.cleanup()} expired sessions')
@@ -0,0 +1,31 @@
+import logging
+from extensions import db
+from utils.jobs import job
+
+logger = logging.getLogger(__name__)
+
+
+@job('send_order_confirmation', queue='email')
+def send_order_confirmation(order_id):
+    """Notify the customer that their order was placed"""
+    from models import Order
+    order = db.session.get(Order, order_id)
+    if order is None:
+        return
+    # No mail transport is configured yet; the message is logged for the ops inbox
+    logger.info('Order confirmation for order #%s sent to %s (total %s)',
+                order.id, order.user.email, order.total_amount)
+
+
+@job('send_contact_message', queue='email')
+def send_contact_message(name, email, subject, message):
+    """Forward a contact form submission to the shop team"""
+    logger.info('Contact message from %s <%s>: %s\n%s', name, email, subject, message)
+
+
+@job('check_low_stock')
+def check_low_stock(product_ids):
+    """Warn about products that dropped below the restock threshold"""
+    from utils.inventory import get_low_stock
+    for product, level in get_low_stock(product_ids=product_ids):
+        logger.warning('Low stock: %s (%s) has %s left', product.name, product.sku, level)
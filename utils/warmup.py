@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+from utils.files import private_dir
+
+logger = logging.getLogger(__name__)
+
+
+def bytecode_cache_dir(app):
+    """Where compiled templates live; shared by every worker of this checkout. None if unsafe"""
+    directory = os.environ.get('TEMPLATE_CACHE_DIR')
+    if not directory:
+        # One directory per checkout, so two deployments on a host never share bytecode
+        digest = hashlib.sha1(app.root_path.encode()).hexdigest()[:12]
+        directory = os.path.join(tempfile.gettempdir(), f'spice-jinja-{digest}')
+    try:
+        # Bytecode is executed as loaded, so nobody else may be able to write it
+        if private_dir(directory):
+            return directory
+    except OSError:
+        pass
+    logger.warning('template bytecode cache disabled; directory is not private to this user',
+                   extra={'directory': directory})
+    return None
+
+
+def init_app(app):
+    """Cache compiled templates on disk; TEMPLATE_CACHE_DIR=off disables it.
+
+    Entries are keyed by template name and checked against the source, so an
+    edited template is recompiled rather than served stale.
+    """
+    if os.environ.get('TEMPLATE_CACHE_DIR', '').lower() == 'off':
+        return
+    directory = bytecode_cache_dir(app)
+    if directory is None:
+        return
+    # Must be set before the first template is loaded, when Flask creates jinja_env
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(directory)}
+
+
+def precompile_templates(app):
+    """Compile every template into the environment (and bytecode cache); returns the count"""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_worker(app):
+    """Pay one-off startup costs before the worker accepts traffic.
+
+    Loads every template, configures the SQLAlchemy mappers, opens a pooled
+    connection and primes the catalog caches the storefront reads first.
+    Failures are logged, never raised: a cold worker still serves requests.
+    """
+    from sqlalchemy.orm import configure_mappers
+    from extensions import db
+    from utils import autocomplete, facets
+
+    timings = {}
+
+    def step(name, f):
+        started = time.perf_counter()
+        try:
+            f()
+        except Exception:
+            logger.exception('worker warm-up step failed', extra={'step': name})
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    with app.app_context():
+        step('templates', lambda: precompile_templates(app))
+        step('mappers', configure_mappers)
+        step('database', lambda: db.session.execute(db.text('SELECT 1')))
+        step('facets', facets.compute_facets)
+        step('autocomplete', lambda: autocomplete.warm(app))
+        db.session.remove()
+    logger.info('worker warmed up', extra={'pid': os.getpid(), 'duration_ms': timings})
+    return timings
+
+
+@click.command('templates-precompile')
+@with_appcontext
+def precompile_command():
+    """Compile all templates into the shared bytecode cache, e.g. during a deploy."""
+    count = precompile_templates(current_app)
+    cache = current_app.jinja_env.bytecode_cache
+    where = cache.directory if cache is not None else 'memory only; bytecode cache disabled'
+    click.echo(f'Compiled {count} templates ({where})')
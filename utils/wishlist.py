@@ -0,0 +1,62 @@
+from flask import g
+from flask_login import current_user
+from models import Product, WishlistItem
+from extensions import db
+
+
+def get_wishlist_ids(product_ids):
+    """Return the subset of product_ids in the current user's wishlist.
+
+    Membership is looked up with one query per batch of unseen ids and
+    remembered for the rest of the request.
+    """
+    if not current_user.is_authenticated:
+        return set()
+
+    known = g.setdefault('wishlist_membership', {})
+    missing = {int(pid) for pid in product_ids} - known.keys()
+    if missing:
+        rows = db.session.query(WishlistItem.product_id).filter(
+            WishlistItem.user_id == current_user.id,
+            WishlistItem.product_id.in_(missing)
+        ).all()
+        found = {row.product_id for row in rows}
+        for pid in missing:
+            known[pid] = pid in found
+
+    return {int(pid) for pid in product_ids if known[int(pid)]}
+
+
+def is_in_wishlist(product_id):
+    """Check a single product against the current user's wishlist"""
+    return int(product_id) in get_wishlist_ids([product_id])
+
+
+def get_wishlist_page(page=1, per_page=12):
+    """Paginate the current user's wishlist, loading the products in bulk"""
+    query = Product.query.join(
+        WishlistItem, WishlistItem.product_id == Product.id
+    ).filter(
+        WishlistItem.user_id == current_user.id
+    ).order_by(WishlistItem.created_at.desc(), WishlistItem.id.desc())
+
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    known = g.setdefault('wishlist_membership', {})
+    for product in pagination.items:
+        known[product.id] = True
+    return pagination
+
+
+def toggle_wishlist(product_id):
+    """Add or remove a product from the current user's wishlist; return the new state"""
+    product_id = int(product_id)
+    deleted = WishlistItem.query.filter_by(user_id=current_user.id, product_id=product_id).delete()
+    if deleted:
+        db.session.commit()
+        in_wishlist = False
+    else:
+        current_user.add_to_wishlist(product_id)
+        in_wishlist = True
+
+    g.setdefault('wishlist_membership', {})[product_id] = in_wishlist
+    return in_wishlist